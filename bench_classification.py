@@ -0,0 +1,114 @@
+import argparse
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import sort_and_update_csv as classifier
+from openai_stub_server import start_stub_server
+
+# Бенчмарк этапа классификации против локального stub-сервера OpenAI:
+# изображений в секунду, загрузка воркеров и накладные расходы на ретраи.
+
+
+def make_suit_folders(root, folders, images_per_folder, image_size):
+    """Создаёт синтетические папки костюмов со случайными «jpg» (серверу важен только хеш)."""
+    rng = random.Random(0)
+    suit_folders = []
+    for i in range(folders):
+        folder_path = os.path.join(root, f"{i+1}. Шерстяной костюм {i+1}")
+        os.makedirs(folder_path, exist_ok=True)
+        image_paths = []
+        for j in range(images_per_folder):
+            image_path = os.path.join(folder_path, f"image{j+1}.jpg")
+            with open(image_path, 'wb') as f:
+                f.write(rng.randbytes(image_size))
+            image_paths.append(image_path)
+        suit_folders.append((os.path.basename(folder_path), image_paths))
+    return suit_folders
+
+
+def fetch_server_stats(base_url):
+    with urllib.request.urlopen(f"{base_url}/stats") as response:
+        return json.loads(response.read())
+
+
+def run_benchmark(suit_folders, prompt, workers):
+    """Классифицирует папки в пуле потоков и возвращает время по папкам и общее время."""
+    durations = []
+
+    def classify_folder(folder):
+        folder_name, image_paths = folder
+        started = time.perf_counter()
+        analysis_results = classifier.analyze_images(folder_name, image_paths, prompt)
+        classifier.select_images(analysis_results)
+        durations.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(classify_folder, suit_folders))
+    return durations, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк классификации костюмов на stub-сервере OpenAI.")
+    parser.add_argument('--folders', type=int, default=20)
+    parser.add_argument('--images-per-folder', type=int, default=6)
+    parser.add_argument('--image-size', type=int, default=50_000, help="размер синтетического изображения в байтах")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--latency', default='lognormal:-1.6,0.4')
+    parser.add_argument('--rpm-limit', type=int, default=0)
+    parser.add_argument('--error-rate-429', type=float, default=0.02)
+    parser.add_argument('--error-rate-500', type=float, default=0.02)
+    parser.add_argument('--cassette', default=None, help="файл записей (по умолчанию — только синтетические ответы)")
+    parser.add_argument('--base-url', default=None, help="внешний stub-сервер вместо встроенного")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        server = None
+        base_url = args.base_url
+        if not base_url:
+            server = start_stub_server(
+                cassette_file=args.cassette or os.path.join(tmp_dir, "cassette.json"),
+                latency=args.latency, rpm_limit=args.rpm_limit, error_rate_429=args.error_rate_429,
+                error_rate_500=args.error_rate_500, seed=args.seed,
+            )
+            base_url = server.base_url
+
+        classifier.init_client(base_url=base_url)
+        prompt = classifier.load_prompt(classifier.PROMPT_FILE)
+        suit_folders = make_suit_folders(tmp_dir, args.folders, args.images_per_folder, args.image_size)
+        stats_before = fetch_server_stats(base_url)
+
+        durations, wall_time = run_benchmark(suit_folders, prompt, args.workers)
+
+        stats_after = fetch_server_stats(base_url)
+        if server:
+            server.shutdown()
+
+    images = args.folders * args.images_per_folder
+    logical_requests = sum(stats["requests"] for stats in classifier.tier_stats.values())
+    server_requests = stats_after["requests"] - stats_before["requests"]
+    retries = server_requests - logical_requests
+    utilization = sum(durations) / (args.workers * wall_time) if wall_time else 0.0
+
+    print(f"Изображений: {images}, папок: {args.folders}, воркеров: {args.workers}")
+    print(f"Время: {wall_time:.2f} с, пропускная способность: {images / wall_time:.2f} изобр./с")
+    print(f"Загрузка воркеров: {utilization:.0%}")
+    print(f"Логических запросов: {logical_requests}, HTTP-запросов к серверу: {server_requests}")
+    print(f"Ретраи: {retries} ({retries / logical_requests:.1%} сверху)" if logical_requests else "Ретраи: 0")
+    print(f"Ответы сервера: {json.dumps({k: stats_after[k] - stats_before[k] for k in stats_after})}")
+    for model, stats in classifier.tier_stats.items():
+        hit_rate = stats["accepted"] / stats["images"] if stats["images"] else 0.0
+        print(f"{model}: запросов {stats['requests']}, попаданий {hit_rate:.0%}, стоимость ${stats['cost']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+import argparse
+import csv
+import itertools
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import scraper
+from ingest_client import BulkIngestSink
+from scraper import BASE_URL, classify_suit_row, contains_suit_keywords, is_exportable, scrape_product
+from profiles import BASE_FIELDS
+from suit_manifest import suit_manifest_entry
+
+# Долгоживущий режим парсера: пулы соединений, индекс дублей, состояние прокси
+# и клиент OpenAI поднимаются один раз, а новые ID принимаются непрерывно —
+# из spool-папки (файлы *.txt с ID по строкам) или по HTTP (POST /ids).
+#
+# Запись в spool-папку должна быть атомарной: сначала пишем файл с любым другим
+# расширением (например, ids.tmp) и только потом переименовываем его в ids.txt.
+# Демон берёт только *.txt, поэтому недописанный файл не будет прочитан наполовину.
+
+SPOOL_DIR = "spool"                        # Сюда кладём файлы с ID (*.tmp -> rename в *.txt)
+DAEMON_OUTPUT_CSV = "daemon_product.csv"   # Строки дописываются по мере обработки
+DAEMON_FAILED_IDS_FILE = "daemon_failed_ids.txt"  # ID, которые не удалось обработать (дописываются)
+WORKERS = 8
+SPOOL_POLL_INTERVAL = 1.0                  # секунд между проверками spool-папки
+PROXY_CHECK_INTERVAL = 300                 # секунд между проверками прокси
+PROXY_CHECK_URL = "https://httpbin.org/ip"
+
+
+class ParserDaemon:
+    """Тёплое состояние парсера, очередь ID и воркеры, которые её разбирают."""
+
+    def __init__(self, workers=WORKERS, spool_dir=SPOOL_DIR, output_csv=DAEMON_OUTPUT_CSV, classify=True):
+        self.workers = workers
+        self.spool_dir = spool_dir
+        self.output_csv = output_csv
+        self.classify = classify
+
+        self.queue = queue.Queue()
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.csv_lock = threading.Lock()
+        self.index_counter = itertools.count()
+        self.threads = []
+
+        self.known_ids = set()
+        self.pending_ids = set()
+        self.prompt = None
+        self.ingest_sink = None
+        self.started_at = None
+        self.classifier = None   # sort_and_update_csv, импортируется только при classify=True
+        self.proxy_state = {"configured": False, "ok": None, "checked_at": None, "error": None}
+        self.stats = {"accepted": 0, "duplicates": 0, "processed": 0, "written": 0, "failed": 0,
+                      "classified": 0, "in_flight": 0, "last_latency": None}
+
+    def start(self):
+        """Поднимает тёплое состояние один раз и запускает воркеры и приём ID."""
+        self.started_at = time.time()
+        os.makedirs(os.path.join(self.spool_dir, "processed"), exist_ok=True)
+
+        self.known_ids = scraper.load_known_ext_ids()
+        if scraper.INGEST_ENABLED:
+            self.ingest_sink = BulkIngestSink(known_ids=self.known_ids)
+        if self.classify:
+            import sort_and_update_csv as classifier
+            self.classifier = classifier
+            self.proxy_state["configured"] = bool(classifier.PROXY)
+            classifier.init_client()
+            self.prompt = classifier.load_prompt(classifier.PROMPT_FILE)
+
+        targets = [self.spool_loop, self.proxy_loop] + [self.worker_loop] * self.workers
+        for target in targets:
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        logging.info(f"Демон запущен: воркеров {self.workers}, известных ID {len(self.known_ids)}")
+
+    def stop(self):
+        """Дожидается текущей очереди, досылает выгрузку и сохраняет снимок дублей."""
+        self.queue.join()
+        self.stop_event.set()
+        if self.ingest_sink:
+            self.ingest_sink.close()
+        logging.info("Демон остановлен.")
+
+    def submit(self, external_ids):
+        """Ставит ID в очередь, отбрасывая уже известные и уже ожидающие. Возвращает число принятых."""
+        accepted = 0
+        with self.lock:
+            for external_id in external_ids:
+                external_id = external_id.strip()
+                if not external_id:
+                    continue
+                if external_id in self.known_ids or external_id in self.pending_ids:
+                    self.stats["duplicates"] += 1
+                    continue
+                self.pending_ids.add(external_id)
+                self.queue.put((external_id, time.monotonic()))
+                accepted += 1
+            self.stats["accepted"] += accepted
+        return accepted
+
+    def worker_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                external_id, queued_at = self.queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            with self.lock:
+                self.stats["in_flight"] += 1
+            try:
+                self.process_id(external_id)
+            except Exception as e:
+                logging.error(f"Ошибка при обработке ID {external_id}: {e}")
+                self.record_failed(external_id)
+            finally:
+                with self.lock:
+                    self.stats["in_flight"] -= 1
+                    self.stats["processed"] += 1
+                    self.stats["last_latency"] = round(time.monotonic() - queued_at, 3)
+                    self.pending_ids.discard(external_id)
+                self.queue.task_done()
+
+    def process_id(self, external_id):
+        """
+        Товар целиком: страница, фото, классификация костюма, строка CSV и выгрузка.
+        Фото нужны только для классификации, поэтому после записи строки их папка удаляется:
+        демон живёт долго, а номера папок после перезапуска начинаются заново.
+        """
+        index = next(self.index_counter)
+        url = f"{BASE_URL}{external_id}"
+        # suits_dict — для suits.json пакетного прогона; в демоне он рос бы без конца
+        product, image_files = scrape_product(url, external_id, index, record_suit=False)
+        if product is None:
+            self.record_failed(external_id)
+            return
+
+        try:
+            if self.classify and image_files and contains_suit_keywords(product['Name']):
+                # Ошибка классификации не теряет товар — строка остаётся с исходными фото
+                classify_suit_row(product, suit_manifest_entry(index, product, image_files), self.prompt)
+                with self.lock:
+                    self.stats["classified"] += 1
+
+            if is_exportable(product):
+                self.write_row(product)
+                if self.ingest_sink:
+                    self.ingest_sink.add(product)
+            with self.lock:
+                self.known_ids.add(external_id)
+        finally:
+            # Та же папка, что создаёт scraper.save_image (даже если ни одно фото не скачалось)
+            shutil.rmtree(f"images/{index+1}. {product['Name']}", ignore_errors=True)
+
+    def record_failed(self, external_id):
+        """Считает неудачу и дописывает ID в DAEMON_FAILED_IDS_FILE, чтобы его можно было перезапустить."""
+        with self.lock:
+            self.stats["failed"] += 1
+        with self.csv_lock:
+            with open(DAEMON_FAILED_IDS_FILE, 'a', encoding='utf-8') as file:
+                file.write(external_id + "\n")
+
+    def write_row(self, product):
+        """Дописывает строку в выходной CSV сразу, чтобы результат был виден без ожидания пачки."""
+        with self.csv_lock:
+            new_file = not os.path.exists(self.output_csv)
+            with open(self.output_csv, mode='a', newline='', encoding='utf-8-sig' if new_file else 'utf-8') as file:
+                writer = csv.writer(file, delimiter=';')
+                if new_file:
+                    writer.writerow(BASE_FIELDS)
+                writer.writerow([product.get(field, '') for field in BASE_FIELDS])
+        with self.lock:
+            self.stats["written"] += 1
+
+    def spool_loop(self):
+        """
+        Забирает файлы *.txt из spool-папки и переносит их в spool/processed под уникальным
+        именем. Файлы *.txt должны появляться атомарным переименованием (см. начало модуля).
+        """
+        while not self.stop_event.is_set():
+            for filename in sorted(os.listdir(self.spool_dir)):
+                path = os.path.join(self.spool_dir, filename)
+                if not filename.endswith('.txt') or not os.path.isfile(path):
+                    continue
+                with open(path, 'r', encoding='utf-8') as file:
+                    accepted = self.submit(file.read().splitlines())
+                shutil.move(path, self.processed_path(filename))
+                logging.info(f"Spool: из '{filename}' принято ID: {accepted}")
+            self.stop_event.wait(SPOOL_POLL_INTERVAL)
+
+    def processed_path(self, filename):
+        """Уникальное имя в spool/processed: файлы с одинаковым именем не затирают друг друга."""
+        stem, ext = os.path.splitext(filename)
+        processed_dir = os.path.join(self.spool_dir, "processed")
+        base = f"{stem}.{int(time.time())}"
+        path = os.path.join(processed_dir, base + ext)
+        n = 1
+        while os.path.exists(path):
+            path = os.path.join(processed_dir, f"{base}.{n}{ext}")
+            n += 1
+        return path
+
+    def proxy_loop(self):
+        """Периодически проверяет прокси и держит его состояние для /health."""
+        while not self.stop_event.is_set():
+            proxies = self.classifier.PROXY if self.classifier else None
+            if proxies:
+                try:
+                    response = scraper.session.get(PROXY_CHECK_URL, proxies=proxies, timeout=10)
+                    ok = response.status_code == 200
+                    error = None if ok else f"HTTP {response.status_code}"
+                except Exception as e:
+                    ok, error = False, str(e)
+                with self.lock:
+                    self.proxy_state.update(ok=ok, error=error, checked_at=int(time.time()))
+                if not ok:
+                    logging.warning(f"Прокси недоступен: {error}")
+            self.stop_event.wait(PROXY_CHECK_INTERVAL)
+
+    def health(self):
+        with self.lock:
+            workers_alive = sum(thread.is_alive() for thread in self.threads)
+            proxy_ok = self.proxy_state["ok"] is not False
+            return {
+                "status": "ok" if proxy_ok and workers_alive == len(self.threads) else "degraded",
+                "uptime": round(time.time() - self.started_at, 1),
+                "threads_alive": workers_alive,
+                "proxy": dict(self.proxy_state),
+                "classifier": bool(self.prompt),
+            }
+
+    def status(self):
+        with self.lock:
+            return dict(self.stats, queue_depth=self.queue.qsize(), known_ids=len(self.known_ids),
+                        failed_ids_file=DAEMON_FAILED_IDS_FILE)
+
+
+class IntakeServer(ThreadingHTTPServer):
+    """HTTP-приём ID и статус демона."""
+
+    daemon_threads = True
+
+    def __init__(self, address, parser_daemon):
+        super().__init__(address, IntakeHandler)
+        self.parser_daemon = parser_daemon
+
+
+class IntakeHandler(BaseHTTPRequestHandler):
+    """POST /ids (JSON-список или ID по строкам), GET /health, GET /status."""
+
+    def log_message(self, format, *args):
+        logging.debug("intake: " + format % args)
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        if path == '/health':
+            health = self.server.parser_daemon.health()
+            self.send_json(200 if health["status"] == "ok" else 503, health)
+        elif path == '/status':
+            self.send_json(200, self.server.parser_daemon.status())
+        else:
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/ids':
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+        # JSON — только если это список; иначе тело — ID по строкам (одиночный "10533886" тоже)
+        try:
+            external_ids = json.loads(body)
+        except ValueError:
+            external_ids = None
+        if not isinstance(external_ids, list):
+            external_ids = body.splitlines()
+        accepted = self.server.parser_daemon.submit(str(external_id) for external_id in external_ids)
+        self.send_json(202, {"accepted": accepted, "queue_depth": self.server.parser_daemon.queue.qsize()})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Демон парсера с тёплыми пулами и приёмом ID на лету.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8091)
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--spool-dir', default=SPOOL_DIR)
+    parser.add_argument('--output', default=DAEMON_OUTPUT_CSV)
+    parser.add_argument('--no-classify', action='store_true', help="не классифицировать фото костюмов")
+    args = parser.parse_args()
+
+    parser_daemon = ParserDaemon(workers=args.workers, spool_dir=args.spool_dir,
+                                 output_csv=args.output, classify=not args.no_classify)
+    parser_daemon.start()
+    server = IntakeServer((args.host, args.port), parser_daemon)
+    logging.info(f"Приём ID: POST http://{args.host}:{args.port}/ids, spool-папка '{args.spool_dir}'")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+        parser_daemon.stop()
+
+
+if __name__ == "__main__":
+    main()
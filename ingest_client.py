@@ -0,0 +1,245 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Массовая выгрузка спаршенных товаров в api-landing прямо во время прогона:
+# пачки по количеству и байтам, keep-alive пул, gzip, ограниченная
+# параллельность, ретраи с ключами идемпотентности и dead-letter файл.
+
+API_BASE_URL = os.getenv("API_BASE_URL", "https://prod.api-landing.com/api")
+INGEST_PATH = "add_company_items"
+COMPANY_ID = "tsum_cs"
+
+SNAPSHOT_FILE = "ext_ids_snapshot.json"        # Локальный снимок external_item_id из базы
+DEAD_LETTER_FILE = "ingest_dead_letter.jsonl"  # Строки, которые API отклонил
+
+# Ретраим только сетевые ошибки, 429 и 5xx
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def load_snapshot(path=SNAPSHOT_FILE):
+    """Загружает снимок external_item_id; None, если снимка ещё нет."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as file:
+        return set(json.load(file)["ids"])
+
+
+def save_snapshot(ids, path=SNAPSHOT_FILE, company_id=COMPANY_ID):
+    """Атомарно перезаписывает снимок external_item_id."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump({"company_id": company_id, "updated_at": int(time.time()), "ids": sorted(ids)}, file)
+    os.replace(tmp_path, path)
+
+
+def to_ingest_record(product):
+    """Переводит строку товара из парсера в запись для API."""
+    return {
+        "external_item_id": product['ID'],
+        "url": product['URL'],
+        "name": product['Name'],
+        "brand": product['Brand'],
+        "article": product['Article'],
+        "gender": product['Gender'],
+        "image": product['Image'],
+        "ext_images": [image for image in product['Ext Images'].split(',') if image],
+        "description": product['Description'],
+        "sizes": [size for size in product.get('Sizes', '').split(',') if size],
+        "color": product.get('Color', ''),
+        "category": product.get('Category', ''),
+    }
+
+
+def idempotency_key(records):
+    """Ключ идемпотентности пачки — хеш отсортированных external_item_id."""
+    ids = sorted(record["external_item_id"] for record in records)
+    return hashlib.sha256(",".join(ids).encode('utf-8')).hexdigest()
+
+
+class BulkIngestSink:
+    """
+    Приёмник товаров для api-landing: add() копит записи и отправляет пачки
+    в фоне, close() дожидается отправки и обновляет локальный снимок дублей.
+    """
+
+    def __init__(self, base_url=API_BASE_URL, company_id=COMPANY_ID, known_ids=None,
+                 max_records=500, max_bytes=1_000_000, max_concurrency=4, max_retries=4,
+                 backoff_base=0.5, timeout=(5, 60),
+                 snapshot_file=SNAPSHOT_FILE, dead_letter_file=DEAD_LETTER_FILE):
+        self.url = f"{base_url.rstrip('/')}/{INGEST_PATH}"
+        self.company_id = company_id
+        self.known_ids = set(known_ids or ())
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self.snapshot_file = snapshot_file
+        self.dead_letter_file = dead_letter_file
+
+        # Один keep-alive пул на все пачки
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'Content-Type': 'application/json',
+            'Content-Encoding': 'gzip',
+            'Connection': 'keep-alive',
+        })
+
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        # В очереди не больше 2×max_concurrency пачек: add() ждёт, пока API не разгребёт
+        self.slots = threading.BoundedSemaphore(max_concurrency * 2)
+        # buffer_lock — для текущей пачки, lock — для статистики, снимка и dead-letter;
+        # воркеры берут только lock, поэтому ожидание слота в add() их не блокирует
+        self.buffer_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.futures = []
+        self.buffer = []
+        self.buffer_bytes = 0
+        self.stats = {"batches": 0, "accepted": 0, "rejected": 0, "retries": 0,
+                      "raw_bytes": 0, "compressed_bytes": 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add(self, product):
+        """Добавляет товар в текущую пачку; полная пачка уходит на отправку."""
+        record = to_ingest_record(product)
+        if record["external_item_id"] in self.known_ids:
+            return
+        size = len(json.dumps(record, ensure_ascii=False).encode('utf-8'))
+        with self.buffer_lock:
+            if self.buffer and self.buffer_bytes + size > self.max_bytes:
+                self._flush_locked()
+            self.buffer.append(record)
+            self.buffer_bytes += size
+            if len(self.buffer) >= self.max_records:
+                self._flush_locked()
+
+    def flush(self):
+        with self.buffer_lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self.buffer:
+            return
+        batch, self.buffer, self.buffer_bytes = self.buffer, [], 0
+        self.slots.acquire()
+        future = self.executor.submit(self._upload, batch)
+        future.add_done_callback(lambda _: self.slots.release())
+        self.futures.append(future)
+
+    def _upload(self, batch):
+        """Отправляет пачку с ретраями; отклонённые строки пишет в dead-letter."""
+        payload = json.dumps({"company_id": self.company_id, "items": batch}, ensure_ascii=False).encode('utf-8')
+        body = gzip.compress(payload)
+        headers = {'Idempotency-Key': idempotency_key(batch)}
+        with self.lock:
+            self.stats["batches"] += 1
+            self.stats["raw_bytes"] += len(payload)
+            self.stats["compressed_bytes"] += len(body)
+
+        error = None
+        retry_after = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                with self.lock:
+                    self.stats["retries"] += 1
+                self._sleep_backoff(attempt - 1, retry_after)
+            try:
+                response = self.session.post(self.url, data=body, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = str(e)
+                retry_after = None
+                continue
+            except requests.RequestException as e:
+                # Ошибки запроса, которые повтор не исправит (неверный URL, редиректы и т.п.)
+                self._dead_letter(batch, f"{type(e).__name__}: {e}")
+                return
+
+            if response.status_code in RETRY_STATUSES:
+                error = f"HTTP {response.status_code}"
+                retry_after = response.headers.get('Retry-After')
+                continue
+            if not response.ok:
+                self._dead_letter(batch, f"HTTP {response.status_code}: {response.text[:500]}")
+                return
+            self._handle_response(batch, response)
+            return
+
+        logging.error(f"Пачка из {len(batch)} товаров не отправлена после {self.max_retries} ретраев: {error}")
+        self._dead_letter(batch, error)
+
+    def _sleep_backoff(self, attempt, retry_after=None):
+        """Экспоненциальная задержка с джиттером; Retry-After от сервера в приоритете."""
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = random.uniform(0, self.backoff_base * 2 ** attempt)
+        time.sleep(delay)
+
+    def _handle_response(self, batch, response):
+        """Принятые id добавляем в снимок, построчно отклонённые — в dead-letter."""
+        try:
+            response_rows = response.json().get("rejected", [])
+        except (ValueError, AttributeError):
+            response_rows = []
+
+        rejected = {}
+        for row in response_rows if isinstance(response_rows, list) else []:
+            if isinstance(row, dict) and row.get("external_item_id") is not None:
+                rejected[str(row["external_item_id"])] = row.get("error", "rejected")
+            else:
+                logging.warning(f"API вернул отклонённую строку без external_item_id: {row!r}")
+
+        rejected_rows = [record for record in batch if record["external_item_id"] in rejected]
+        for record in rejected_rows:
+            self._dead_letter([record], rejected[record["external_item_id"]])
+        with self.lock:
+            for record in batch:
+                if record["external_item_id"] not in rejected:
+                    self.known_ids.add(record["external_item_id"])
+            self.stats["accepted"] += len(batch) - len(rejected_rows)
+
+    def _dead_letter(self, records, error):
+        with self.lock:
+            self.stats["rejected"] += len(records)
+            with open(self.dead_letter_file, 'a', encoding='utf-8') as file:
+                for record in records:
+                    file.write(json.dumps({"error": error, "record": record}, ensure_ascii=False) + "\n")
+
+    def close(self):
+        """
+        Досылает остаток, ждёт все пачки, сохраняет снимок дублей и возвращает статистику.
+        Снимок сохраняется даже при ошибке, чтобы уже принятые id не выгружались повторно.
+        """
+        try:
+            self.flush()
+            for future in self.futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.error(f"Ошибка при отправке пачки: {e}")
+        finally:
+            self.executor.shutdown()
+            self.session.close()
+            if self.snapshot_file:
+                with self.lock:
+                    known_ids = set(self.known_ids)
+                save_snapshot(known_ids, self.snapshot_file, self.company_id)
+        return self.stats
@@ -0,0 +1,137 @@
+import argparse
+import gzip
+import json
+import logging
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Локальная замена api-landing для проверки ingest_client.py: принимает
+# gzip-пачки, помнит ключи идемпотентности, построчно отклоняет товары
+# без названия и отдаёт get_company_items постранично, как настоящий API.
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class IngestStubServer(ThreadingHTTPServer):
+    """HTTP-сервер с хранилищем товаров и счётчиками для обработчика."""
+
+    daemon_threads = True
+
+    def __init__(self, address, error_rate_503=0.0, seed=None):
+        super().__init__(address, IngestStubHandler)
+        self.error_rate_503 = error_rate_503
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.items = {}              # external_item_id -> запись
+        self.idempotent_responses = {}
+        self.stats = {"requests": 0, "batches": 0, "duplicate_batches": 0, "accepted": 0,
+                      "rejected": 0, "injected_503": 0}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api"
+
+
+class IngestStubHandler(BaseHTTPRequestHandler):
+    """Обработчик /api/add_company_items, /api/get_company_items и /stats."""
+
+    def log_message(self, format, *args):
+        logging.debug("ingest stub: " + format % args)
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        server = self.server
+        if url.path.rstrip('/') == '/stats':
+            with server.lock:
+                self.send_json(200, dict(server.stats))
+        elif url.path.rstrip('/') == '/api/get_company_items':
+            query = parse_qs(url.query)
+            limit = int(query.get('limit', ['100'])[0])
+            page = int(query.get('page', ['1'])[0])
+            with server.lock:
+                items = list(server.items.values())[(page - 1) * limit:page * limit]
+            self.send_json(200, items)
+        else:
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        server = self.server
+        if urlparse(self.path).path.rstrip('/') != '/api/add_company_items':
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+
+        with server.lock:
+            server.stats["requests"] += 1
+            if server.rng.random() < server.error_rate_503:
+                server.stats["injected_503"] += 1
+                inject = True
+            else:
+                inject = False
+        if inject:
+            self.send_json(503, {"error": "Injected unavailability (stub)"})
+            return
+
+        key = self.headers.get('Idempotency-Key')
+        with server.lock:
+            if key and key in server.idempotent_responses:
+                server.stats["duplicate_batches"] += 1
+                self.send_json(200, server.idempotent_responses[key])
+                return
+
+            payload = json.loads(body)
+            rejected = []
+            for item in payload.get("items", []):
+                if not item.get("name") or item["name"] == 'N/A':
+                    rejected.append({"external_item_id": item.get("external_item_id"), "error": "name is required"})
+                    continue
+                server.items[item["external_item_id"]] = item
+            response = {"accepted": len(payload.get("items", [])) - len(rejected), "rejected": rejected}
+            server.stats["batches"] += 1
+            server.stats["accepted"] += response["accepted"]
+            server.stats["rejected"] += len(rejected)
+            if key:
+                server.idempotent_responses[key] = response
+        self.send_json(200, response)
+
+
+def start_ingest_stub_server(host='127.0.0.1', port=0, **options):
+    """Запускает сервер в фоновом потоке и возвращает его (адрес API — server.base_url)."""
+    server = IngestStubServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная замена api-landing для выгрузки товаров.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--error-rate-503', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    server = IngestStubServer((args.host, args.port), error_rate_503=args.error_rate_503, seed=args.seed)
+    logging.info(f"Stub-сервер api-landing запущен: API_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Stub-сервер остановлен.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Локальный OpenAI-совместимый сервер для офлайн-прогонов классификации:
+# отвечает записанными chat-completion ответами по хешу запроса, умеет
+# записывать их с настоящего API, добавлять задержку, rate-limit заголовки
+# и подмешивать 429/500.
+
+CASSETTE_FILE = "openai_cassette.json"          # Файл с записанными ответами
+UPSTREAM_URL = "https://api.openai.com/v1"      # Куда ходить в режиме записи
+
+# Метки, из которых собираем синтетический ответ при промахе по записям
+SYNTHETIC_LABELS = ("full", "top", "bottom", "other")
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def request_hash(body):
+    """Ключ записи: sha256 от канонического JSON модели и сообщений запроса."""
+    key = {"model": body.get("model"), "messages": body.get("messages"),
+           "response_format": body.get("response_format")}
+    canonical = json.dumps(key, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def parse_latency(spec):
+    """
+    Разбирает описание распределения задержки в функцию rng -> секунды:
+    'fixed:0.2', 'uniform:0.1,0.5', 'normal:0.3,0.05', 'lognormal:-1.5,0.5'.
+    """
+    if not spec:
+        return lambda rng: 0.0
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(',') if v]
+    if kind == 'fixed':
+        return lambda rng: values[0]
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == 'normal':
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == 'lognormal':
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"Неизвестное распределение задержки: {spec}")
+
+
+def count_images(body):
+    """Сколько изображений в запросе (для синтетического ответа на пачку)."""
+    count = 0
+    for message in body.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, list):
+            count += sum(1 for part in content if part.get("type") == "image_url")
+    return max(count, 1)
+
+
+def synthesize_completion(body, key):
+    """Детерминированный ответ по хешу запроса, если записи для него нет."""
+    rng = random.Random(key)
+    results = [
+        {"index": i, "label": rng.choice(SYNTHETIC_LABELS),
+         "confidence": round(rng.uniform(0.4, 1.0), 2), "caption": "synthetic"}
+        for i in range(count_images(body))
+    ]
+    content = json.dumps({"results": results})
+    return {
+        "id": f"chatcmpl-stub-{key[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": 850 * len(results), "completion_tokens": 30 * len(results),
+                  "total_tokens": 880 * len(results)},
+    }
+
+
+class StubServer(ThreadingHTTPServer):
+    """HTTP-сервер с записями, настройками и счётчиками для обработчика."""
+
+    daemon_threads = True
+
+    def __init__(self, address, mode='replay', cassette_file=CASSETTE_FILE, upstream_url=UPSTREAM_URL,
+                 latency=None, rpm_limit=0, error_rate_429=0.0, error_rate_500=0.0,
+                 miss_policy='synthesize', seed=None):
+        super().__init__(address, StubHandler)
+        self.mode = mode
+        self.cassette_file = cassette_file
+        self.upstream_url = upstream_url.rstrip('/')
+        self.latency = parse_latency(latency)
+        self.rpm_limit = rpm_limit
+        self.error_rate_429 = error_rate_429
+        self.error_rate_500 = error_rate_500
+        self.miss_policy = miss_policy
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.request_times = deque()
+        self.stats = {"requests": 0, "replayed": 0, "recorded": 0, "synthesized": 0, "missed": 0,
+                      "injected_429": 0, "injected_500": 0, "rate_limited": 0}
+        self.cassette = {}
+        if os.path.exists(cassette_file):
+            with open(cassette_file, 'r', encoding='utf-8') as file:
+                self.cassette = json.load(file)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def save_cassette(self):
+        with open(self.cassette_file, 'w', encoding='utf-8') as file:
+            json.dump(self.cassette, file, ensure_ascii=False)
+
+    def draw(self):
+        """Задержка и решение об инъекции ошибки — под одним замком, чтобы seed был воспроизводим."""
+        with self.lock:
+            delay = self.latency(self.rng)
+            roll = self.rng.random()
+        if roll < self.error_rate_429:
+            return delay, 429
+        if roll < self.error_rate_429 + self.error_rate_500:
+            return delay, 500
+        return delay, None
+
+    def rate_limit_state(self):
+        """Скользящее окно в 60 секунд: (лимит, остаток, секунд до сброса, превышен ли)."""
+        now = time.monotonic()
+        with self.lock:
+            while self.request_times and now - self.request_times[0] > 60:
+                self.request_times.popleft()
+            limit = self.rpm_limit or 10000
+            exceeded = bool(self.rpm_limit) and len(self.request_times) >= self.rpm_limit
+            if not exceeded:
+                self.request_times.append(now)
+            reset = 60 - (now - self.request_times[0]) if self.request_times else 0.0
+            return limit, max(limit - len(self.request_times), 0), reset, exceeded
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Обработчик /v1/chat/completions и /stats."""
+
+    def log_message(self, format, *args):
+        logging.debug("stub: " + format % args)
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, status, message, error_type, headers=None):
+        self.send_json(status, {"error": {"message": message, "type": error_type, "code": None}}, headers)
+
+    def do_GET(self):
+        if self.path.rstrip('/') in ('/stats', '/v1/stats'):
+            with self.server.lock:
+                self.send_json(200, dict(self.server.stats))
+        else:
+            self.send_error_json(404, f"Unknown path {self.path}", "invalid_request_error")
+
+    def do_POST(self):
+        if self.path.rstrip('/') not in ('/v1/chat/completions', '/chat/completions'):
+            self.send_error_json(404, f"Unknown path {self.path}", "invalid_request_error")
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        server = self.server
+        server.count("requests")
+
+        limit, remaining, reset, exceeded = server.rate_limit_state()
+        headers = {
+            'x-ratelimit-limit-requests': str(limit),
+            'x-ratelimit-remaining-requests': str(remaining),
+            'x-ratelimit-reset-requests': f"{reset:.3f}s",
+            'x-request-id': f"req_stub_{server.stats['requests']}",
+        }
+
+        delay, injected = server.draw()
+        time.sleep(delay)
+
+        if exceeded:
+            server.count("rate_limited")
+            headers['retry-after'] = f"{max(reset, 0.0):.3f}"
+            self.send_error_json(429, "Rate limit reached (stub)", "requests", headers)
+            return
+        if injected == 429:
+            server.count("injected_429")
+            headers['retry-after'] = "0.1"
+            self.send_error_json(429, "Injected rate limit (stub)", "requests", headers)
+            return
+        if injected == 500:
+            server.count("injected_500")
+            self.send_error_json(500, "Injected server error (stub)", "server_error", headers)
+            return
+
+        key = request_hash(body)
+        if key in server.cassette:
+            server.count("replayed")
+            self.send_json(200, server.cassette[key], headers)
+        elif server.mode == 'record':
+            self.record(body, key, headers)
+        elif server.miss_policy == 'synthesize':
+            server.count("synthesized")
+            self.send_json(200, synthesize_completion(body, key), headers)
+        else:
+            server.count("missed")
+            self.send_error_json(404, f"No recorded response for {key}", "invalid_request_error", headers)
+
+    def record(self, body, key, headers):
+        """Режим записи: проксируем запрос в настоящий API и сохраняем ответ."""
+        server = self.server
+        request = urllib.request.Request(
+            f"{server.upstream_url}/chat/completions",
+            data=json.dumps(body).encode('utf-8'),
+            headers={'Content-Type': 'application/json',
+                     'Authorization': self.headers.get('Authorization', '')},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                payload = json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            self.send_json(e.code, json.loads(e.read() or b'{}'), headers)
+            return
+        with server.lock:
+            server.cassette[key] = payload
+            server.stats["recorded"] += 1
+            server.save_cassette()
+        self.send_json(200, payload, headers)
+
+
+def start_stub_server(host='127.0.0.1', port=0, **options):
+    """Запускает сервер в фоновом потоке и возвращает его (адрес — server.base_url)."""
+    server = StubServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный OpenAI-совместимый сервер с записью/воспроизведением.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--mode', choices=('replay', 'record'), default='replay')
+    parser.add_argument('--cassette', default=CASSETTE_FILE)
+    parser.add_argument('--upstream', default=UPSTREAM_URL)
+    parser.add_argument('--latency', default=None, help="fixed:0.2 | uniform:0.1,0.5 | normal:m,s | lognormal:mu,sigma")
+    parser.add_argument('--rpm-limit', type=int, default=0)
+    parser.add_argument('--error-rate-429', type=float, default=0.0)
+    parser.add_argument('--error-rate-500', type=float, default=0.0)
+    parser.add_argument('--miss-policy', choices=('synthesize', 'error'), default='synthesize')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    server = StubServer(
+        (args.host, args.port), mode=args.mode, cassette_file=args.cassette, upstream_url=args.upstream,
+        latency=args.latency, rpm_limit=args.rpm_limit, error_rate_429=args.error_rate_429,
+        error_rate_500=args.error_rate_500, miss_policy=args.miss_policy, seed=args.seed,
+    )
+    logging.info(f"Stub-сервер OpenAI запущен: OPENAI_BASE_URL={server.base_url} (режим {args.mode})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Stub-сервер остановлен.")
+
+
+if __name__ == "__main__":
+    main()
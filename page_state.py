@@ -0,0 +1,356 @@
+import json
+import re
+
+# Маркеры встроенного состояния страницы, которые ищем без построения DOM
+LD_JSON_TYPE = 'application/ld+json'
+STATE_SCRIPT_IDS = ('__NEXT_DATA__', '__NUXT_DATA__')
+STATE_ASSIGNMENTS = ('window.__INITIAL_STATE__', 'window.__PRELOADED_STATE__', 'window.__NUXT__')
+
+# Ключ, под которым в server-rendered состоянии лежит карточка товара
+PRODUCT_KEY_PATTERN = re.compile(r'"(?:product|productCard|productData)"\s*:\s*\{')
+# Строковые литералы и скобки — чтобы считать глубину вложенности без разбора JSON
+JSON_STRUCTURE_PATTERN = re.compile(r'"(?:[^"\\]|\\.)*"|[{}\[\]]')
+
+_decoder = json.JSONDecoder()
+
+
+def iter_script_blocks(html):
+    """
+    Потоково проходит по <script>-блокам страницы через str.find.
+    Возвращает пары (атрибуты_тега, содержимое) — без BeautifulSoup и без DOM.
+    """
+    lower = html.lower()
+    pos = 0
+    while True:
+        start = lower.find('<script', pos)
+        if start == -1:
+            return
+        tag_end = lower.find('>', start)
+        if tag_end == -1:
+            return
+        end = lower.find('</script', tag_end)
+        if end == -1:
+            return
+        yield lower[start:tag_end], html[tag_end + 1:end]
+        pos = end + 9
+
+
+def find_state_blocks(html):
+    """
+    Находит блоки встроенного состояния: JSON-LD и server-rendered initial state.
+    Возвращает список пар (вид_блока, текст_блока), JSON-LD идёт первым.
+    """
+    ld_blocks = []
+    state_blocks = []
+    for attrs, body in iter_script_blocks(html):
+        if LD_JSON_TYPE in attrs:
+            ld_blocks.append(('ld', body))
+        elif any(f'id="{script_id.lower()}"' in attrs for script_id in STATE_SCRIPT_IDS):
+            state_blocks.append(('state', body))
+        else:
+            stripped = body.lstrip()
+            for assignment in STATE_ASSIGNMENTS:
+                if stripped.startswith(assignment):
+                    # Отрезаем "window.__X__ =" и оставляем только JSON
+                    state_blocks.append(('state', stripped[len(assignment):].lstrip(' =')))
+                    break
+    return ld_blocks + state_blocks
+
+
+# Ключи поддерева состояния с картинками и размерами
+IMAGE_KEYS = ('images', 'photos', 'gallery', 'media')
+SIZE_KEYS = ('sizes', 'skus', 'variants')
+
+# Поля, по которым узнаём товар страницы среди вложенных карточек (рекомендации и т.п.)
+PRODUCT_ID_KEYS = ('id', 'productId', 'externalId', 'sku', 'article', 'vendorCode', 'productID')
+
+
+def matches_external_id(data, external_id):
+    """Есть ли у карточки товара идентификатор, совпадающий с ID из ссылки."""
+    if not external_id:
+        return False
+    return any(str(data.get(key, '')).strip() == external_id for key in PRODUCT_ID_KEYS)
+
+
+def iter_key_depths(text, positions):
+    """
+    Для отсортированных позиций в тексте JSON возвращает глубину вложенности
+    объектов/массивов в каждой из них (None — позиция внутри строки).
+    Текст проходится один раз регуляркой по строкам и скобкам, без разбора JSON.
+    """
+    tokens = JSON_STRUCTURE_PATTERN.finditer(text)
+    token = next(tokens, None)
+    depth = 0
+    for target in positions:
+        while token and token.start() < target:
+            if token.end() > target:
+                break           # позиция внутри строкового литерала
+            ch = token.group()[0]
+            if ch in '{[':
+                depth += 1
+            elif ch in '}]':
+                depth -= 1
+            token = next(tokens, None)
+        inside_string = token is not None and token.start() < target < token.end()
+        yield None if inside_string else depth
+
+
+def decode_product_subtree(text, external_id=None):
+    """
+    Декодирует только поддерево товара из большого блока состояния:
+    ищем ключи "product": {...} и разбираем JSON с этих позиций через raw_decode,
+    не трогая остальное состояние страницы.
+    В состоянии бывают и чужие карточки (рекомендации, "с этим покупают"), поэтому
+    берём карточку с ID товара из ссылки, а если такой нет — самую неглубокую.
+    """
+    matches = list(PRODUCT_KEY_PATTERN.finditer(text))
+    best = None
+    best_depth = None
+    for match, depth in zip(matches, iter_key_depths(text, [m.start() for m in matches])):
+        if depth is None:
+            continue
+        try:
+            subtree, _ = _decoder.raw_decode(text, match.end() - 1)
+        except ValueError:
+            continue
+        if not isinstance(subtree, dict) or not first_value(subtree, ('name', 'title')):
+            continue
+        if matches_external_id(subtree, external_id):
+            return subtree
+        if best_depth is None or depth < best_depth:
+            best, best_depth = subtree, depth
+    return best
+
+
+def iter_ld_nodes(data):
+    """Разворачивает JSON-LD: список, @graph или одиночный объект."""
+    if isinstance(data, list):
+        for item in data:
+            yield from iter_ld_nodes(item)
+    elif isinstance(data, dict):
+        if '@graph' in data:
+            yield from iter_ld_nodes(data['@graph'])
+        else:
+            yield data
+
+
+def ld_type_is(node, type_name):
+    node_type = node.get('@type')
+    if isinstance(node_type, list):
+        return type_name in node_type
+    return node_type == type_name
+
+
+def first_value(data, keys):
+    """Первое непустое значение из словаря по списку возможных ключей."""
+    for key in keys:
+        value = data.get(key)
+        if value not in (None, '', [], {}):
+            return value
+    return None
+
+
+def as_text(value):
+    """Приводит строку или объект вида {"name": ...} к строке."""
+    if isinstance(value, dict):
+        value = first_value(value, ('name', 'title', 'value'))
+    if isinstance(value, list):
+        value = ', '.join(as_text(v) for v in value if as_text(v))
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def as_image_list(value):
+    """Нормализует список картинок: строки или объекты с url/src/contentUrl."""
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        value = [value]
+    images = []
+    for item in value:
+        if isinstance(item, dict):
+            item = first_value(item, ('url', 'src', 'contentUrl', 'original', 'large'))
+        if isinstance(item, str) and item:
+            images.append(item)
+    return images
+
+
+def as_size_list(value):
+    """Нормализует размеры: строки или объекты с name/value/size."""
+    if not isinstance(value, list):
+        return []
+    sizes = []
+    for item in value:
+        if isinstance(item, dict):
+            item = first_value(item, ('name', 'value', 'size', 'title'))
+        if item not in (None, ''):
+            sizes.append(str(item).strip())
+    return sizes
+
+
+def gender_from_urls(urls):
+    for url in urls:
+        if 'muzhskoe' in url:
+            return 'male'
+        if 'zhenskoe' in url:
+            return 'female'
+        if 'unisex' in url:
+            return 'unisex'
+    return 'N/A'
+
+
+def product_from_ld(nodes, external_id=None):
+    """
+    Собирает поля товара из узлов JSON-LD (Product + BreadcrumbList) — узлы
+    собираются со всех ld+json блоков страницы, обычно это разные теги.
+    """
+    products = [n for n in nodes if ld_type_is(n, 'Product')]
+    product = next((n for n in products if matches_external_id(n, external_id)), None)
+    product = product or next(iter(products), None)
+    if not product or not product.get('name'):
+        return None
+
+    breadcrumb_names = []
+    breadcrumb_urls = []
+    crumbs = next((n for n in nodes if ld_type_is(n, 'BreadcrumbList')), None)
+    if crumbs:
+        for element in crumbs.get('itemListElement', []):
+            item = element.get('item')
+            if isinstance(item, dict):
+                breadcrumb_urls.append(item.get('@id', item.get('url', '')))
+                breadcrumb_names.append(as_text(item) or as_text(element.get('name')))
+            else:
+                breadcrumb_urls.append(item or '')
+                breadcrumb_names.append(as_text(element.get('name')))
+
+    sizes = []
+    offers = product.get('offers')
+    if isinstance(offers, dict):
+        offers = offers.get('offers', [offers])
+    if isinstance(offers, list):
+        sizes = [as_text(offer.get('size')) for offer in offers if isinstance(offer, dict) and offer.get('size')]
+
+    audience = product.get('audience') or {}
+    gender = as_text(audience.get('suggestedGender')).lower() if isinstance(audience, dict) else ''
+
+    return {
+        'Brand': as_text(product.get('brand')),
+        'Name': as_text(product.get('name')),
+        'Article': as_text(first_value(product, ('sku', 'mpn', 'productID'))),
+        'Description': as_text(product.get('description')),
+        'Sizes': sizes,
+        'Color': as_text(product.get('color')),
+        'Category': as_text(product.get('category')) or (breadcrumb_names[-1] if breadcrumb_names else ''),
+        'Gender': gender if gender in ('male', 'female', 'unisex') else gender_from_urls(breadcrumb_urls),
+        'images': as_image_list(product.get('image')),
+        'images_source': 'ld',
+        # Поля, которые источник вообще умеет передавать на этой странице
+        'declared': {
+            field for field, present in (
+                ('Sizes', isinstance(offers, list)),
+                ('Category', bool(product.get('category') or crumbs)),
+                ('Gender', bool(gender or crumbs)),
+                ('images', 'image' in product),
+            ) if present
+        },
+    }
+
+
+def product_from_state(subtree):
+    """Собирает поля товара из поддерева server-rendered состояния."""
+    breadcrumbs = subtree.get('breadcrumbs') or []
+    breadcrumb_urls = [b.get('url', b.get('href', '')) for b in breadcrumbs if isinstance(b, dict)]
+    category = as_text(first_value(subtree, ('category', 'categoryName')))
+    if not category and breadcrumbs:
+        category = as_text(breadcrumbs[-1])
+
+    gender = as_text(first_value(subtree, ('gender', 'sex'))).lower()
+    if gender not in ('male', 'female', 'unisex'):
+        gender = gender_from_urls(breadcrumb_urls)
+
+    return {
+        'Brand': as_text(first_value(subtree, ('brand', 'brandName', 'designer'))),
+        'Name': as_text(first_value(subtree, ('name', 'title'))),
+        'Article': as_text(first_value(subtree, ('article', 'vendorCode', 'sku', 'articleNumber'))),
+        'Description': as_text(first_value(subtree, ('description', 'descriptionText'))),
+        'Sizes': as_size_list(first_value(subtree, SIZE_KEYS)),
+        'Color': as_text(first_value(subtree, ('color', 'colour', 'colorName'))),
+        'Category': category,
+        'Gender': gender,
+        'images': as_image_list(first_value(subtree, IMAGE_KEYS)),
+        'images_source': 'state',
+        'declared': {
+            field for field, keys in (
+                ('Sizes', SIZE_KEYS),
+                ('Category', ('category', 'categoryName', 'breadcrumbs')),
+                ('Gender', ('gender', 'sex', 'breadcrumbs')),
+                ('images', IMAGE_KEYS),
+            ) if any(key in subtree for key in keys)
+        },
+    }
+
+
+def is_empty(value):
+    return value in (None, '', [], 'N/A')
+
+
+def merge_products(primary, secondary):
+    """
+    Объединяет товар из двух источников по полям: пустые поля primary берутся из
+    secondary, картинки — из источника с более длинной каруселью (в JSON-LD обычно
+    одно-два фото, в server-rendered состоянии — вся карусель).
+    """
+    merged = dict(primary)
+    for field, value in secondary.items():
+        if field not in ('images', 'images_source', 'declared') and is_empty(merged.get(field)):
+            merged[field] = value
+    if len(secondary['images']) > len(primary['images']):
+        merged['images'] = secondary['images']
+        merged['images_source'] = secondary['images_source']
+    merged['declared'] = primary['declared'] | secondary['declared']
+    return merged
+
+
+def extract_product_state(html, external_id=None):
+    """
+    Быстрый путь: извлекает товар из встроенного JSON-состояния страницы.
+    Возвращает словарь с полями Brand/Name/Article/Description/Sizes/Color/
+    Category/Gender и списком картинок карусели в 'images', либо None, если
+    блока состояния нет — тогда нужен DOM-парсер. JSON-LD и initial state
+    объединяются по полям (merge_products). Служебные ключи: 'images_source'
+    ('ld' или 'state') и 'declared' — поля, которые источники передают на этой
+    странице; остальные искать в DOM бессмысленно только ради пустого значения.
+    external_id (ID из ссылки) помогает отличить товар страницы от вложенных карточек.
+    """
+    ld_nodes = []
+    state_texts = []
+    for kind, text in find_state_blocks(html):
+        if kind == 'ld':
+            try:
+                ld_nodes.extend(iter_ld_nodes(json.loads(text)))
+            except ValueError:
+                continue
+        else:
+            state_texts.append(text)
+
+    products = []
+    # Product и BreadcrumbList обычно лежат в разных тегах — разбираем все узлы вместе
+    if ld_nodes:
+        product = product_from_ld(ld_nodes, external_id)
+        if product and product['Name']:
+            products.append(product)
+
+    for text in state_texts:
+        subtree = decode_product_subtree(text, external_id)
+        product = product_from_state(subtree) if subtree else None
+        if product and product['Name']:
+            products.append(product)
+            break
+
+    if not products:
+        return None
+    merged = products[0]
+    for product in products[1:]:
+        merged = merge_products(merged, product)
+    return merged
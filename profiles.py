@@ -0,0 +1,269 @@
+import csv
+import os
+import re
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tqdm import tqdm
+
+import scraper
+from ingest_client import BulkIngestSink
+from suit_manifest import save_suit_manifest, suit_manifest_entry
+from scraper import (
+    BASE_URL, build_product_data, contains_suit_keywords, extract_product, fetch_product_page, is_exportable,
+    read_ids, save_image, select_image_slots, suits_dict,
+)
+
+# Реестр профилей извлечения (варианты parser 1/2/3 из README.txt). Все профили
+# работают с одними и теми же страницами товаров: за прогон каждая страница
+# скачивается и разбирается один раз, а строки пишутся сразу для всех профилей.
+# run_profiles — единственный цикл обхода: parser_3.py запускает профиль 'parser_3',
+# выгрузка в API, классификация костюмов и манифест работают для любого профиля.
+# Настройки прогона, сессия и функции разбора страниц — общие, из scraper.py.
+#
+# Что задаёт профиль: файл с ID, выходной CSV, набор колонок, ключевые слова полной
+# карусели и 'selectors' — регулярки по исходнику страницы для ДОПОЛНИТЕЛЬНЫХ колонок
+# (первая группа первого совпадения). Базовые поля (BASE_FIELDS) у всех профилей общие
+# и извлекаются scraper.extract_product (встроенное состояние + DOM); переопределить
+# их или задать CSS-селектор через реестр нельзя.
+
+BASE_FIELDS = [
+    'URL', 'ID', 'Name', 'Brand', 'Article', 'Gender',
+    'Image', 'Ext Images', 'Description', 'Sizes',
+    'Color', 'Category'
+]
+
+PROFILES = {
+    # parser 1 — нынешний парсер (+ категория, цвет)
+    'parser_1': {
+        'ids_file': 'IDS1.txt',
+        'output_csv': 'products1.csv',
+        'fields': BASE_FIELDS,
+        'selectors': {},
+        'full_carousel_keywords': [],
+    },
+    # parser 2 — категория, цвет и content_id, свой файл с ID
+    'parser_2': {
+        'ids_file': 'IDs_links_content.txt',
+        'output_csv': 'products2.csv',
+        'fields': BASE_FIELDS + ['Content ID'],
+        'selectors': {
+            # Дополнительные поля ищем регулярками прямо в исходнике страницы
+            'Content ID': [r'"content_?[iI]d"\s*:\s*"?([\w-]+)', r'data-content-id="([^"]+)"'],
+        },
+        'full_carousel_keywords': [],
+    },
+    # parser 3 — как первый, но для костюмов и смокингов выгружается вся карусель
+    'parser_3': {
+        'ids_file': 'IDs.txt',
+        'output_csv': 'product.csv',
+        'fields': BASE_FIELDS,
+        'selectors': {},
+        'full_carousel_keywords': ["костюм", "смокинг"],
+    },
+}
+
+
+def compile_profile(name, spec):
+    """Один раз компилирует регулярки селекторов и правило полной карусели профиля."""
+    keywords = spec['full_carousel_keywords']
+    return {
+        'name': name,
+        'ids_file': spec['ids_file'],
+        'output_csv': spec['output_csv'],
+        'fields': list(spec['fields']),
+        'selectors': {
+            field: [re.compile(pattern) for pattern in patterns]
+            for field, patterns in spec['selectors'].items()
+        },
+        'full_carousel': (
+            re.compile(rf'\b(?:{"|".join(map(re.escape, keywords))})\b', re.IGNORECASE) if keywords else None
+        ),
+    }
+
+
+COMPILED_PROFILES = {name: compile_profile(name, spec) for name, spec in PROFILES.items()}
+
+
+def apply_selectors(profile, html):
+    """Значения дополнительных полей профиля: первое совпадение по списку регулярок."""
+    values = {}
+    for field, patterns in profile['selectors'].items():
+        values[field] = 'N/A'
+        for pattern in patterns:
+            match = pattern.search(html)
+            if match:
+                values[field] = scraper.clean_text(match.group(1))
+                break
+    return values
+
+
+def wants_full_carousel(profile, product_name):
+    rule = profile['full_carousel']
+    return bool(rule and product_name and rule.search(product_name))
+
+
+def process_product(external_id, index, profiles):
+    """
+    Скачивает и разбирает страницу один раз, затем строит строку для каждого профиля.
+    Картинки сохраняются один раз — объединением слайдов, отобранных всеми профилями.
+    Возвращает ({имя_профиля: строка}, {путь_к_файлу: ссылка}) — файлы нужны для
+    манифеста костюмов; (None, {}), если страница не скачалась.
+    """
+    url = f"{BASE_URL}{external_id}"
+    html = fetch_product_page(url)
+    if html is None:
+        return None, {}
+
+    product = extract_product(html, url)
+    rows = {}
+    saved_slots = set()
+    image_files = {}
+    for profile in profiles:
+        full_carousel = wants_full_carousel(profile, product['Name'])
+        slots = select_image_slots(product['images'], full_carousel)
+        for i, image_url in slots:
+            if i not in saved_slots:
+                saved_slots.add(i)
+                file_path = save_image(image_url, index, i+1, product['Name'])
+                if file_path:
+                    image_files[file_path] = image_url
+
+        images = [image_url for _, image_url in slots]
+        if full_carousel:
+            suits_dict[product['Name']] = list(images)
+
+        row = build_product_data(external_id, url, product, images)
+        row.update(apply_selectors(profile, html))
+        rows[profile['name']] = row
+    return rows, image_files
+
+
+def run_profiles(profile_names):
+    """Один обход страниц для всех выбранных профилей и отдельный CSV на каждый профиль."""
+    profiles = []
+    profile_ids = {}
+    for name in profile_names:
+        profile = COMPILED_PROFILES[name]
+        if not os.path.exists(profile['ids_file']):
+            print(f"Профиль {name}: файл '{profile['ids_file']}' не найден, пропускаем.")
+            continue
+        profiles.append(profile)
+        profile_ids[name] = read_ids(profile['ids_file'])
+        print(f"Профиль {name}: ID в файле {len(profile_ids[name])}")
+
+    # Общий список страниц: каждая страница скачивается один раз, даже если нужна нескольким профилям
+    unique_ids = list(dict.fromkeys(i for name in profile_ids for i in profile_ids[name]))
+    id_sets = {name: set(ids) for name, ids in profile_ids.items()}
+    profiles_by_id = {
+        external_id: [p for p in profiles if external_id in id_sets[p['name']]]
+        for external_id in unique_ids
+    }
+
+    # Перед запуском удаляем папку images, чтобы каждый раз начинать "с нуля"
+    if os.path.exists('images'):
+        shutil.rmtree('images')
+
+    ext_ids_bd = scraper.load_known_ext_ids()
+    new_ids = [external_id for external_id in unique_ids if external_id not in ext_ids_bd]
+    print(f"Страниц к обходу: {len(new_ids)} (профилей: {len(profiles)})")
+
+    # Выгрузка в API и классификация костюмов — те же флаги, что в scraper.py
+    ingest_sink = BulkIngestSink(known_ids=ext_ids_bd) if scraper.INGEST_ENABLED else None
+    prompt = scraper.init_classifier() if scraper.CLASSIFY_SUITS else None
+
+    rows_by_id = {}
+    failed_ids = []
+    suit_manifest = {}
+    classify_futures = []
+
+    def finalize(external_id, rows):
+        # Строки готовы: и страница, и (для костюмов) классификация фото
+        rows_by_id[external_id] = rows
+        # В API уходит одна запись на товар — базовые поля у всех профилей общие
+        row = next(iter(rows.values()))
+        if ingest_sink and is_exportable(row):
+            ingest_sink.add(row)
+
+    def classify_and_finalize(external_id, rows, suit, targets):
+        # Классифицируем один раз и проставляем Full/Top/Bottom всем строкам с полной каруселью
+        classified = scraper.classify_suit_row(rows[targets[0]], suit, prompt)
+        for name in targets[1:]:
+            rows[name]['Image'] = classified['Image']
+            rows[name]['Ext Images'] = classified['Ext Images']
+        finalize(external_id, rows)
+
+    # Страницы качаются в одном пуле, костюмы классифицируются параллельно в своём
+    with ThreadPoolExecutor(max_workers=scraper.SCRAPE_WORKERS) as executor, \
+            ThreadPoolExecutor(max_workers=scraper.CLASSIFY_WORKERS) as classify_executor:
+        futures = {
+            executor.submit(process_product, external_id, index, profiles_by_id[external_id]): (index, external_id)
+            for index, external_id in enumerate(new_ids)
+        }
+        with tqdm(total=len(futures), desc="Обработка ссылок", unit=" запросов") as pbar:
+            for future in as_completed(futures):
+                index, external_id = futures[future]
+                try:
+                    rows, image_files = future.result()
+                    if rows is None:
+                        failed_ids.append(external_id)
+                    else:
+                        row = next(iter(rows.values()))
+                        if image_files and contains_suit_keywords(row['Name']):
+                            # Та же запись манифеста, что читает sort_and_update_csv.py
+                            suit = suit_manifest[external_id] = suit_manifest_entry(index, row, image_files)
+                            # Full/Top/Bottom нужны профилям, которые выгружают карусель костюма целиком
+                            targets = [p['name'] for p in profiles_by_id[external_id]
+                                       if wants_full_carousel(p, row['Name'])]
+                            if prompt is not None and targets:
+                                # Карусель костюма скачана — сразу в очередь на классификацию
+                                classify_futures.append(
+                                    classify_executor.submit(classify_and_finalize, external_id, rows, suit, targets)
+                                )
+                                rows = None
+                        if rows is not None:
+                            finalize(external_id, rows)
+                except Exception as e:
+                    print(f"Ошибка при обработке ID {external_id}: {e}")
+                    failed_ids.append(external_id)
+                pbar.update(1)
+
+        # Дожидаемся классификации, запущенной по ходу загрузки
+        for classify_future in classify_futures:
+            classify_future.result()
+
+    # Строки пишем в порядке ID во входном файле профиля
+    for profile in profiles:
+        count_new_items = 0
+        with open(profile['output_csv'], mode='w', newline='', encoding='utf-8-sig') as file:
+            writer = csv.writer(file, delimiter=';')
+            writer.writerow(profile['fields'])
+            for external_id in profile_ids[profile['name']]:
+                row = (rows_by_id.get(external_id) or {}).get(profile['name'])
+                if row and is_exportable(row):
+                    writer.writerow([row.get(field, 'N/A') for field in profile['fields']])
+                    count_new_items += 1
+        print(f"Профиль {profile['name']}: сохранено {count_new_items} из {len(profile_ids[profile['name']])} "
+              f"в {profile['output_csv']}")
+
+    scraper.save_failed_ids(failed_ids)
+    policy_stats = scraper.policy.stats
+    print(f"Запросы: {policy_stats['requests']}, ретраев: {policy_stats['retries']}, "
+          f"хеджей: {policy_stats['hedges']} (выиграли: {policy_stats['hedge_wins']}), неудач: {policy_stats['failed']}")
+
+    if prompt is not None:
+        scraper.log_classifier_stats()
+
+    if ingest_sink:
+        ingest_stats = ingest_sink.close()
+        print(f"Выгружено в API: {ingest_stats['accepted']}, отклонено: {ingest_stats['rejected']} "
+              f"(см. {ingest_sink.dead_letter_file}), пачек: {ingest_stats['batches']}, ретраев: {ingest_stats['retries']}")
+
+    save_suit_manifest(suit_manifest)
+    if any(profile['full_carousel'] for profile in profiles):
+        scraper.save_suits_json()
+
+
+if __name__ == "__main__":
+    # python profiles.py [parser_1 parser_2 parser_3] — по умолчанию все профили
+    run_profiles(sys.argv[1:] or list(PROFILES))
@@ -0,0 +1,230 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+# Политика HTTP-запросов для парсера: таймауты на соединение и чтение, общий
+# дедлайн на логический запрос, ретраи только для временных ошибок (экспонента
+# с джиттером) и хеджирование — дубль запроса после p95 задержки, проигравший
+# запрос бросается: вызывающий получает первый успешный ответ, не дожидаясь
+# второго. Доля запросов с дублем ограничена hedge_budget.
+
+# Временные ошибки, которые имеет смысл повторить
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+RETRY_EXCEPTIONS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+CHUNK_SIZE = 64 * 1024
+
+
+class RequestFailed(Exception):
+    """Запрос не удался: постоянная ошибка, исчерпаны ретраи или вышел дедлайн."""
+
+    def __init__(self, url, reason, attempts):
+        super().__init__(f"{url}: {reason} (попыток: {attempts})")
+        self.url = url
+        self.reason = reason
+        self.attempts = attempts
+
+
+class RetryableError(Exception):
+    """Внутренний сигнал: попытка не удалась, но её можно повторить."""
+
+    def __init__(self, reason, retry_after=None):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class LatencyTracker:
+    """Скользящее окно задержек успешных запросов для расчёта квантиля."""
+
+    def __init__(self, window=200):
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def add(self, latency):
+        with self.lock:
+            self.samples.append(latency)
+
+    def quantile(self, q, min_samples):
+        with self.lock:
+            if len(self.samples) < min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class RequestPolicy:
+    """
+    GET-запросы через общий requests.Session по единой политике:
+    get() возвращает ответ с уже прочитанным телом или бросает RequestFailed.
+    Задержки считаются отдельно по видам запросов (kind: страницы, картинки, API).
+    При хеджировании основной запрос и дубль идут в пуле hedge_workers, а вызывающий
+    поток только ждёт первый успешный ответ. Пул (и пул соединений сессии) должен
+    вмещать основной запрос и дубль на каждый вызывающий поток плюс брошенные
+    проигравшие, которые ещё ждут заголовки (не дольше read_timeout).
+    """
+
+    def __init__(self, session, connect_timeout=5, read_timeout=20, total_deadline=45,
+                 max_retries=3, backoff_base=0.5, backoff_max=8.0,
+                 hedge=True, hedge_quantile=0.95, hedge_min_samples=20, hedge_workers=20,
+                 hedge_budget=0.1):
+        self.session = session
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_deadline = total_deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_budget = hedge_budget   # доля логических запросов, для которых можно слать дубль
+        self.hedge_executor = ThreadPoolExecutor(max_workers=hedge_workers) if hedge else None
+        self.trackers = {}
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "failed": 0}
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def tracker(self, kind):
+        with self.lock:
+            return self.trackers.setdefault(kind, LatencyTracker())
+
+    def get(self, url, kind='default', hedge=None, **kwargs):
+        """Логический GET: ретраи и хеджирование в пределах total_deadline."""
+        self.count("requests")
+        deadline = time.monotonic() + self.total_deadline
+        hedge = self.hedge if hedge is None else hedge
+        reason = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.count("retries")
+            try:
+                if hedge and self.hedge_executor:
+                    return self.hedged_attempt(url, kind, deadline, kwargs)
+                return self.attempt(url, kind, deadline, kwargs)
+            except RequestFailed as e:
+                self.count("failed")
+                raise RequestFailed(url, e.reason, attempt + 1)
+            except RetryableError as e:
+                reason = str(e)
+                delay = self.backoff_delay(attempt, e.retry_after)
+                if attempt == self.max_retries or time.monotonic() + delay >= deadline:
+                    break
+                time.sleep(delay)
+
+        self.count("failed")
+        raise RequestFailed(url, reason, attempt + 1)
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """Экспонента с полным джиттером; Retry-After от сервера в приоритете."""
+        try:
+            return min(float(retry_after), self.backoff_max)
+        except (TypeError, ValueError):
+            return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def attempt(self, url, kind, deadline, kwargs, cancelled=None, started_event=None):
+        """
+        Одна попытка: таймауты (connect, read) и чтение тела кусками с проверкой
+        дедлайна и флага отмены. Постоянные ошибки сразу бросают RequestFailed.
+        started_event отмечает фактический старт попытки, запущенной в пуле.
+        """
+        if started_event is not None:
+            started_event.set()
+        started = time.monotonic()
+        remaining = deadline - started
+        if remaining <= 0:
+            raise RetryableError("дедлайн запроса истёк")
+
+        try:
+            response = self.session.get(
+                url, stream=True, timeout=(self.connect_timeout, min(self.read_timeout, remaining)), **kwargs
+            )
+        except RETRY_EXCEPTIONS as e:
+            raise RetryableError(f"{type(e).__name__}: {e}")
+        except requests.RequestException as e:
+            # Неверный URL, петля редиректов и т.п. — повтор не поможет
+            raise RequestFailed(url, f"{type(e).__name__}: {e}", 1)
+
+        with response:
+            if response.status_code in RETRY_STATUSES:
+                raise RetryableError(f"HTTP {response.status_code}", response.headers.get('Retry-After'))
+            if response.status_code >= 400:
+                raise RequestFailed(url, f"HTTP {response.status_code}", 1)
+
+            chunks = []
+            try:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if cancelled is not None and cancelled.is_set():
+                        raise RetryableError("запрос отменён")
+                    if time.monotonic() > deadline:
+                        raise RetryableError("дедлайн истёк при чтении ответа")
+                    chunks.append(chunk)
+            except RETRY_EXCEPTIONS as e:
+                raise RetryableError(f"{type(e).__name__}: {e}")
+            except requests.RequestException as e:
+                raise RequestFailed(url, f"{type(e).__name__}: {e}", 1)
+
+        # Тело уже прочитано: дальше response.text / .json() работают как обычно
+        response._content = b''.join(chunks)
+        self.tracker(kind).add(time.monotonic() - started)
+        return response
+
+    def take_hedge(self):
+        """Разрешает дубль, если доля хеджированных запросов не превышает hedge_budget."""
+        with self.lock:
+            if self.stats["hedges"] >= self.hedge_budget * self.stats["requests"]:
+                return False
+            self.stats["hedges"] += 1
+            return True
+
+    def hedged_attempt(self, url, kind, deadline, kwargs):
+        """
+        Попытка с хеджированием: основной запрос уходит в пул, и если за p95 для этого
+        вида запросов (считая от его фактического старта) ответа нет, отправляем дубль.
+        Возвращаем первый успешный ответ сразу; проигравший бросаем — он закрывает
+        ответ на следующем куске тела, а если ещё ждёт заголовки, доживает в пуле
+        не дольше read_timeout, не задерживая вызывающего.
+        """
+        hedge_delay = self.tracker(kind).quantile(self.hedge_quantile, self.hedge_min_samples)
+        if hedge_delay is None:
+            return self.attempt(url, kind, deadline, kwargs)
+
+        cancelled = threading.Event()
+        started = threading.Event()
+        primary = self.hedge_executor.submit(self.attempt, url, kind, deadline, kwargs, cancelled, started)
+        pending = {primary}
+        try:
+            # Очередь пула не съедает таймер хеджа: отсчёт p95 — от старта основного запроса
+            started.wait(max(deadline - time.monotonic(), 0))
+            done, _ = wait(pending, timeout=min(hedge_delay, max(deadline - time.monotonic(), 0)))
+            if not done and self.take_hedge():
+                pending.add(self.hedge_executor.submit(self.attempt, url, kind, deadline, kwargs, cancelled))
+
+            error = None
+            while pending:
+                done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0),
+                                     return_when=FIRST_COMPLETED)
+                if not done:
+                    raise RetryableError("дедлайн истёк в ожидании хеджированного запроса")
+                for future in done:
+                    try:
+                        response = future.result()
+                    except RequestFailed:
+                        raise
+                    except RetryableError as e:
+                        error = e
+                        continue
+                    if future is not primary:
+                        self.count("hedge_wins")
+                    return response
+            raise error
+        finally:
+            # Проигравший прерывается на следующем куске тела; ответ победителя уже прочитан
+            cancelled.set()
@@ -0,0 +1,480 @@
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup
+import re
+import os
+import json
+from urllib.parse import urljoin
+
+from page_state import extract_product_state
+from request_policy import RequestFailed, RequestPolicy
+from ingest_client import API_BASE_URL, COMPANY_ID, load_snapshot, save_snapshot
+
+# Общее состояние и функции парсера страниц товаров: настройки прогона, keep-alive
+# сессия с политикой запросов, извлечение полей, картинки, дубли и выгрузка.
+# Один экземпляр на процесс: его используют profiles.py, daemon.py и точка входа parser_3.py.
+
+# Глобальный словарь для костюмов/смокингов: { "название_товара": [список_ссылок], ... }
+suits_dict = {}
+
+# Режим извлечения: 'state' — сначала встроенное JSON-состояние страницы (JSON-LD /
+# initial state), с откатом на DOM; 'dom' — только разбор HTML через BeautifulSoup
+EXTRACTION_MODE = 'state'
+# Поля, которые добираются из DOM, если источник состояния их передаёт, но они пустые.
+# Картинки из DOM берутся, только если их нет вовсе или у костюма есть лишь фото из JSON-LD.
+STATE_FALLBACK_FIELDS = ('Gender', 'Sizes', 'Category')
+
+# Выгрузка товаров прямо в api-landing по ходу прогона (см. ingest_client.py).
+# При включённой выгрузке дубли проверяются по локальному снимку ext_ids_snapshot.json,
+# который выгрузка сама дополняет; FULL_RESYNC=True заново скачивает все id из базы.
+INGEST_ENABLED = False
+FULL_RESYNC = False
+
+# Классификация фото костюмов (sort_and_update_csv.py) прямо по ходу загрузки: как только
+# карусель костюма скачана, он уходит в отдельный пул, не дожидаясь конца парсинга.
+# Нужен OPENAI_API_KEY (или OPENAI_BASE_URL); без неё можно запустить sort_and_update_csv.py отдельно.
+# sort_and_update_csv (openai, dotenv) импортируется только при включённой классификации.
+CLASSIFY_SUITS = False
+CLASSIFY_WORKERS = 4
+
+# Политика запросов (request_policy.py): таймауты и общий дедлайн на страницу/картинку,
+# ретраи временных ошибок и хеджирование медленных запросов после p95 задержки.
+# ID, которые так и не удалось скачать, пишутся в FAILED_IDS_FILE, а не в CSV строками 'N/A'.
+HEDGE_REQUESTS = True
+FAILED_IDS_FILE = "failed_ids.txt"
+
+# Потоков обхода страниц (profiles.run_profiles); пул соединений и пул дублей считаются от него
+SCRAPE_WORKERS = 20
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/117.0',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Sec-Fetch-User': '?1',
+}
+
+# Общий keep-alive пул соединений для страниц, картинок и API (живёт весь процесс).
+# На каждый поток обхода — основной запрос и дубль в пуле хеджирования, плюс запас
+# на брошенные проигравшие запросы, которые ещё ждут заголовки
+HEDGE_POOL_SIZE = 3 * SCRAPE_WORKERS
+session = requests.Session()
+session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=HEDGE_POOL_SIZE))
+session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=HEDGE_POOL_SIZE))
+
+# Страницы и картинки: короткие дедлайны и хеджирование (не больше 10% запросов);
+# API базы: большие страницы, без дублей
+policy = RequestPolicy(session, connect_timeout=5, read_timeout=20, total_deadline=45,
+                       hedge=HEDGE_REQUESTS, hedge_workers=HEDGE_POOL_SIZE, hedge_budget=0.1)
+api_policy = RequestPolicy(session, connect_timeout=10, read_timeout=120, total_deadline=300, hedge=False)
+
+def fetch_product_page(url):
+    """Скачивает страницу товара и возвращает HTML; None, если запрос не удался."""
+    try:
+        response = policy.get(url, kind='page', headers=HEADERS)
+        response.encoding = response.apparent_encoding
+    except RequestFailed as err:
+        print(f"Не удалось скачать страницу: {err}")
+        return None
+    return response.text
+
+def get_product_data(url, external_id, index):
+    """Запись товара или None, если страницу не удалось скачать."""
+    product_data, _ = scrape_product(url, external_id, index)
+    return product_data
+
+def scrape_product(url, external_id, index, record_suit=True):
+    """
+    Скачивает и разбирает товар, сохраняет отобранные фото.
+    Возвращает (запись_товара, {путь_к_файлу: ссылка}) — пути нужны для классификации
+    костюмов без повторного обхода папки images; (None, {}), если страница не скачалась.
+    record_suit=False — не добавлять костюм в suits_dict (долгоживущий демон).
+    """
+    html = fetch_product_page(url)
+    if html is None:
+        return None, {}
+
+    product = extract_product(html, url)
+    image_files = {}
+    product_images = pick_images(
+        image_urls=product['images'],
+        product_name=product['Name'],
+        index=index,
+        contains_keywords=contains_suit_keywords(product['Name']),
+        image_files=image_files,
+        record_suit=record_suit
+    )
+    return build_product_data(external_id, url, product, product_images), image_files
+
+def extract_product(html, url):
+    """
+    Извлекает поля товара и всю карусель (ссылки по слайдам) из HTML страницы.
+    Картинки здесь не отбираются и не скачиваются — это делает pick_images.
+    """
+    # Быстрый путь: товар из встроенного JSON-состояния страницы, без DOM
+    if EXTRACTION_MODE == 'state':
+        state_product = extract_product_state(html, external_id_from_url(url))
+        if state_product:
+            product = product_from_state(state_product, url)
+            missing = [
+                field for field in STATE_FALLBACK_FIELDS
+                if field in state_product['declared'] and is_missing(product[field])
+            ]
+            # Для костюма нужна вся карусель, а в JSON-LD обычно одно-два фото
+            needs_carousel = is_missing(product['images']) or (
+                state_product['images_source'] == 'ld' and contains_suit_keywords(product['Name'])
+            )
+            if missing or needs_carousel:
+                # Состояние неполное — добираем недостающее из вёрстки
+                dom_product = product_from_dom(html, url)
+                for field in missing:
+                    if not is_missing(dom_product[field]):
+                        product[field] = dom_product[field]
+                if len([i for i in dom_product['images'] if i]) > len(product['images']):
+                    product['images'] = dom_product['images']
+            return product
+    return product_from_dom(html, url)
+
+def external_id_from_url(url):
+    """ID товара — последний сегмент ссылки вида {BASE_URL}{external_id}."""
+    return url.rstrip('/').rsplit('/', 1)[-1]
+
+def is_missing(value):
+    return value in (None, '', 'N/A') or (isinstance(value, list) and not any(value))
+
+def product_from_dom(html, url):
+    """Разбор страницы через BeautifulSoup по CSS-классам вёрстки."""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    product_brand = 'N/A'
+    product_name = 'N/A'
+    product_article = 'N/A'
+    product_gender = 'N/A'
+    product_description = ''
+    product_size = ''
+    product_color = ''
+    product_category = ''
+
+    # Бренд
+    product_brand_tag = soup.find('span', {'class': 'description__visuallyHidden____sjk5'})
+    if product_brand_tag:
+        product_brand = product_brand_tag.get_text(strip=True)
+
+    # Название
+    product_name_tag = soup.find('h1', {'data-test-id': 'productTitle'})
+    if product_name_tag:
+        product_name_span = product_name_tag.find('span', class_='description__visuallyHidden____sjk5')
+        if product_name_span:
+            raw_name = product_name_tag.text.strip()
+            raw_hidden = product_name_span.text.strip()
+            # Убираем скрытый <span> из полного текста:
+            product_name = raw_name.replace(raw_hidden, '').strip()
+            product_name = clean_text(product_name)
+
+    # Артикул
+    article_tag = soup.find('li', string=lambda t: t and "Артикул:" in t)
+    if article_tag:
+        product_article = article_tag.get_text(strip=True).replace('Артикул:', '').strip()
+        product_article = clean_text(product_article)
+
+    # Гендер
+    gender_tag = soup.select_one('ul.Breadcrumbs__breadcrumbs___dbDQw a[href*="/catalog/muzhskoe-"], a[href*="/catalog/zhenskoe-"], a[href*="/catalog/unisex-"]')
+    if gender_tag:
+        if 'muzhskoe' in gender_tag['href']:
+            product_gender = 'male'
+        elif 'zhenskoe' in gender_tag['href']:
+            product_gender = 'female'
+        elif 'unisex' in gender_tag['href']:
+            product_gender = 'unisex'
+
+    # Описание
+    description_tag = soup.find('section', {
+        'class': 'SegmentsView__section___jGPx8 SegmentsView__section_show___BWJGT', 
+        'data-test-id': 'productInfoSectionWrapper'
+    })
+    if description_tag:
+        description_p = description_tag.find('p')
+        if description_p:
+            product_description = clean_text(description_p.get_text(strip=True))
+
+    # Размер
+    size_data = soup.find('ul', {
+        'class': 'Sizes__sizes___geUvy', 
+        'data-test-id': 'productSizeWrapper'
+    })
+    if size_data:
+        collected_sizes = []
+        for size_tag in size_data.find_all('li'):
+            class_li = size_tag.get('class', [])
+            # Игнорируем li, у которых классы 'Sizes__sizesMobileTitle___skPu9' или 'Sizes__uppercase___U1DRS'
+            if ('Sizes__sizesMobileTitle___skPu9' not in class_li and 
+                'Sizes__uppercase___U1DRS' not in class_li):
+                spans = size_tag.find_all('span')
+                if spans:
+                    # Берём последний span, предположительно содержащий сам размер
+                    size_span_text = spans[-1].get_text(strip=True)
+                    if size_span_text:
+                        collected_sizes.append(clean_text(size_span_text))
+        if collected_sizes:
+            product_size = ",".join(collected_sizes)
+
+    # Цвет
+    color_tag = soup.find('span', {'class': 'SingleColor__colorTitle___VTGcs'})
+    product_color = color_tag.get_text(strip=True) if color_tag else 'N/A'
+
+    # Категория
+    breadcrumbs_tag = soup.find('ul', {'class': 'Breadcrumbs__breadcrumbs___dbDQw'})
+    if breadcrumbs_tag:
+        last_breadcrumb = breadcrumbs_tag.find_all('li')[-1]
+        category_link = last_breadcrumb.find('a')
+        product_category = category_link.get_text(strip=True) if category_link else 'N/A'
+
+    return {
+        'Brand': product_brand,
+        'Name': product_name,
+        'Article': product_article,
+        'Gender': product_gender,
+        'Description': product_description,
+        'Sizes': product_size,
+        'Color': product_color,
+        'Category': product_category,
+        'images': get_slide_images(soup, url),
+    }
+
+def product_from_state(state_product, url):
+    """Поля товара из встроенного JSON-состояния страницы (см. page_state.py)."""
+    return {
+        'Brand': state_product['Brand'] or 'N/A',
+        'Name': clean_text(state_product['Name']) or 'N/A',
+        'Article': clean_text(state_product['Article']) or 'N/A',
+        'Gender': state_product['Gender'],
+        'Description': clean_text(state_product['Description']),
+        'Sizes': ",".join(clean_text(size) for size in state_product['Sizes'] if size),
+        'Color': state_product['Color'] or 'N/A',
+        'Category': state_product['Category'] or 'N/A',
+        # В состоянии сразу лежит вся карусель
+        'images': [urljoin(url, image_url) for image_url in state_product['images']],
+    }
+
+def contains_suit_keywords(product_name):
+    """Проверяем "костюм" / "смокинг" в названии."""
+    keywords = ["костюм", "смокинг"]
+    pattern = rf'\b(?:{"|".join(map(re.escape, keywords))})\b'
+    return bool(re.search(pattern, product_name, re.IGNORECASE)) if product_name else False
+
+def build_product_data(external_id, url, product, product_images):
+    """Выбирает 1-ю фото (Image) и "Ext Images" (2, 3, 4...) для CSV и собирает запись товара."""
+    product_image = 'N/A'
+    product_other_images = []
+    if len(product_images) >= 4:
+        product_image = product_images[2]  # третья
+        product_other_images = [product_images[1], product_images[3]]
+    elif len(product_images) == 3:
+        product_image = product_images[1]  # вторая
+        product_other_images = [product_images[0], product_images[2]]
+    elif len(product_images) == 2:
+        product_image = product_images[1]
+        product_other_images = [product_images[0]]
+    elif len(product_images) == 1:
+        product_image = product_images[0]
+
+    # Результат
+    product_data = {
+        'ID': external_id,
+        'Brand': product['Brand'],
+        'Name': product['Name'],
+        'Article': product['Article'],
+        'URL': url,
+        'Image': product_image,
+        'Ext Images': ','.join(product_other_images),
+        'Gender': product['Gender'],
+        'Description': product['Description'],
+        'Sizes': product['Sizes'],
+        'Color': product['Color'],
+        'Category': product['Category']
+    }
+    return product_data
+
+def clean_text(text):
+    """Удаляем непечатаемые символы и NUL."""
+    return re.sub(r'[^\x20-\x7Eа-яА-ЯёЁ]', '', text)
+
+def get_slide_images(soup, base_url):
+    """
+    Собираем ссылки из div.Desktop__slide___S6W7J по порядку слайдов.
+    Слайд без <img> сохраняет свою позицию (None), чтобы нумерация файлов не съезжала.
+    """
+    slide_divs = soup.find_all('div', {'class': 'Desktop__slide___S6W7J'})
+
+    image_urls = []
+    for div in slide_divs:
+        image_tag = div.find('img')
+        if image_tag:
+            image_url = image_tag.get('data-src', image_tag.get('src', 'N/A'))
+            image_urls.append(urljoin(base_url, image_url))
+        else:
+            image_urls.append(None)
+    return image_urls
+
+def select_image_slots(image_urls, full_carousel):
+    """
+    Отбираем фото карусели (ссылки по слайдам, None — слайд без фото):
+    * Если full_carousel=True (костюм/смокинг):
+      - Собираем все фото, без ограничений
+    * Иначе:
+      - Ограничиваемся максимум 4 картинками, пропуская первую при exactly 4
+    * При этом избавляемся от дубликатов, сохраняя порядок карусели.
+    Возвращает список (номер_слайда, ссылка).
+    """
+    # Используем set, чтобы отфильтровать повторяющиеся ссылки
+    images_set = set()
+    slots = []
+
+    for i, image_url in enumerate(image_urls):
+        if not full_carousel:
+            # Если НЕ костюм / смокинг, берём до 4 фото (пропуская 1-ю если их ровно 4)
+            if i >= 4:
+                break
+            if len(image_urls) == 4 and i == 0:
+                continue
+        if image_url and image_url not in images_set:
+            images_set.add(image_url)
+            slots.append((i, image_url))
+    return slots
+
+def pick_images(image_urls, product_name, index, contains_keywords, image_files=None, record_suit=True):
+    """
+    Отбирает фото карусели через select_image_slots и сохраняет их на диск.
+    Если передан словарь image_files, в него складываются {путь_к_файлу: ссылка}.
+    Костюмы попадают в suits_dict, если record_suit=True.
+    """
+    slots = select_image_slots(image_urls, contains_keywords)
+    for i, image_url in slots:
+        # Сохраняем файл
+        file_path = save_image(image_url, index, i+1, product_name)
+        if file_path and image_files is not None:
+            image_files[file_path] = image_url
+
+    images = [image_url for _, image_url in slots]
+    if contains_keywords and record_suit:
+        # Сохраняем эти ссылки в глобальный suits_dict
+        suits_dict[product_name] = list(images)
+    return images
+
+def save_image(url, index, image_number, product_name):
+    """
+    Сохраняет картинку в папку images/{index+1}. {product_name}/image{image_number}.jpg
+    Возвращает путь к файлу или None, если картинку не удалось скачать.
+    """
+    folder_name = f"images/{index+1}. {product_name}"
+    os.makedirs(folder_name, exist_ok=True)
+
+    try:
+        response = policy.get(url, kind='image')
+    except RequestFailed as err:
+        print(f"Не удалось скачать картинку: {err}")
+        return None
+
+    filename = f"image{image_number}.jpg"
+    file_path = os.path.join(folder_name, filename)
+    with open(file_path, 'wb') as f:
+        f.write(response.content)
+    return file_path
+
+# --- ОСНОВНОЙ КОД ---
+
+BASE_URL = 'https://www.tsum.ru/product/'
+
+def read_ids(ids_file):
+    """Считываем IDs из файла (пустые строки пропускаем)."""
+    with open(ids_file, 'r', encoding='utf-8') as file:
+        return [line.strip() for line in file if line.strip()]
+
+# Получаем уже имеющиеся external_item_id из базы (если нужно)
+def fetch_all_ext_ids():
+    base_url = f"{API_BASE_URL}/get_company_items"
+    company_id = COMPANY_ID
+    limit = 10000
+    page = 1
+    ext_ids = []
+
+    while True:
+        params = {
+            "company_id": company_id,
+            "limit": limit,
+            "page": page
+        }
+        response = api_policy.get(base_url, kind='api', params=params)
+        data_json = response.json()
+        
+        if not data_json:
+            break
+
+        for item in data_json:
+            if "external_item_id" in item:
+                ext_ids.append(item["external_item_id"])
+        page += 1
+
+    print(f"Всего найдено external_id в базе данных: {len(ext_ids)}")
+    return ext_ids
+
+def load_known_ext_ids():
+    """
+    Уже имеющиеся external_item_id: при включённой выгрузке — из локального снимка,
+    иначе (или при FULL_RESYNC) — полной выгрузкой из базы с обновлением снимка.
+    """
+    ext_ids_bd = load_snapshot() if INGEST_ENABLED and not FULL_RESYNC else None
+    if ext_ids_bd is None:
+        ext_ids_bd = set(fetch_all_ext_ids())
+        save_snapshot(ext_ids_bd)
+    else:
+        print(f"Всего external_id в локальном снимке: {len(ext_ids_bd)}")
+    return ext_ids_bd
+
+def is_exportable(product):
+    """Отсекаем 'unisex' и товары без нормального имени."""
+    return product['Gender'] != 'unisex' and product['Name'] != 'N/A'
+
+def save_suits_json():
+    """Сохраняем suits_dict в JSON, чтобы видеть все ссылки для костюмов/смокингов."""
+    if suits_dict:
+        with open("suits.json", "w", encoding="utf-8") as jf:
+            json.dump(suits_dict, jf, ensure_ascii=False, indent=2)
+        print("JSON для костюмов/смокингов сохранён в 'suits.json'.")
+    else:
+        print("Не найдено товаров с 'костюм' или 'смокинг'. JSON не создан.")
+
+def save_failed_ids(failed_ids):
+    """Сохраняем ID, страницы которых не удалось скачать, чтобы перезапустить только их."""
+    with open(FAILED_IDS_FILE, "w", encoding="utf-8") as ff:
+        ff.write("\n".join(failed_ids))
+    if failed_ids:
+        print(f"Не удалось скачать {len(failed_ids)} товаров, их ID сохранены в '{FAILED_IDS_FILE}'.")
+
+def init_classifier():
+    """Поднимает клиент OpenAI и загружает промпт; возвращает промпт для classify_suit_row."""
+    import sort_and_update_csv as classifier
+    classifier.init_client()
+    return classifier.load_prompt(classifier.PROMPT_FILE)
+
+def classify_suit_row(product, suit, prompt):
+    """
+    Классифицирует фото костюма (запись манифеста suit) и проставляет Full/Top/Bottom в строку.
+    Ошибка классификации не теряет товар: строка остаётся с исходными фото.
+    """
+    import sort_and_update_csv as classifier
+    try:
+        classifier.apply_suit_images(product, *classifier.classify_suit(suit['folder'], suit['images'], prompt))
+    except Exception as e:
+        print(f"Ошибка классификации фото для {suit['folder']}: {e}")
+    return product
+
+def log_classifier_stats():
+    """Доля попаданий и стоимость по уровням каскада классификации."""
+    import sort_and_update_csv as classifier
+    classifier.log_tier_stats()
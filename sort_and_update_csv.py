@@ -3,19 +3,23 @@ import csv
 import logging
 import time
 import base64
+import json
+import threading
 import requests
 from pathlib import Path
 from dotenv import load_dotenv
 from openai import OpenAI, OpenAIError
 
+from suit_manifest import SUITS_MANIFEST_FILE, load_suit_manifest
+
 # Загрузка переменных окружения из .env файла
 load_dotenv()
 
-# Установите API-ключ OpenAI из переменных окружения
+# API-ключ OpenAI из переменных окружения
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    logging.error("API-ключ OpenAI не найден. Пожалуйста, установите его в переменную окружения OPENAI_API_KEY.")
-    exit(1)
+# Адрес OpenAI-совместимого API; для офлайн-прогонов — локальный openai_stub_server.py
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
 
 # Настройка прокси
 proxy_ip = os.getenv("PROXY_IP")
@@ -23,7 +27,9 @@ port = os.getenv("PROXY_PORT")
 proxy_username = os.getenv("PROXY_USERNAME")
 proxy_password = os.getenv("PROXY_PASSWORD")
 
-if proxy_username and proxy_password:
+if not proxy_ip:
+    PROXY = None
+elif proxy_username and proxy_password:
     PROXY = {
         "http": f"http://{proxy_username}:{proxy_password}@{proxy_ip}:{port}",
         "https": f"http://{proxy_username}:{proxy_password}@{proxy_ip}:{port}"
@@ -34,10 +40,6 @@ else:
         "https": f"http://{proxy_ip}:{port}"
     }
 
-# Установка переменных окружения для прокси
-os.environ["HTTP_PROXY"] = PROXY["http"]
-os.environ["HTTPS_PROXY"] = PROXY["https"]
-
 # Настраиваем логирование
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -56,19 +58,71 @@ def test_proxy(proxies):
         logging.error(f"Ошибка подключения через прокси: {e}")
         exit(1)
 
-# Проверка прокси перед запуском
-test_proxy(PROXY)
+# Клиент OpenAI создаётся в init_client(), чтобы модуль можно было импортировать без сети
+client = None
+
+def init_client(base_url=None, api_key=None):
+    """
+    Создаёт клиента OpenAI. С base_url (или OPENAI_BASE_URL) запросы идут на
+    указанный сервер — ключ не обязателен, а прокси не проверяется и не ставится.
+    """
+    global client
+    base_url = base_url or OPENAI_BASE_URL
+    api_key = api_key or OPENAI_API_KEY
+
+    if not api_key:
+        if not base_url:
+            logging.error("API-ключ OpenAI не найден. Пожалуйста, установите его в переменную окружения OPENAI_API_KEY.")
+            exit(1)
+        api_key = "stub"  # локальный сервер ключ не проверяет
+
+    if PROXY and not base_url:
+        # Установка переменных окружения для прокси и проверка перед запуском
+        os.environ["HTTP_PROXY"] = PROXY["http"]
+        os.environ["HTTPS_PROXY"] = PROXY["https"]
+        test_proxy(PROXY)
+
+    client = OpenAI(api_key=api_key, base_url=base_url, max_retries=OPENAI_MAX_RETRIES)
+    return client
 
 # Конфигурация
-client = OpenAI(api_key=OPENAI_API_KEY)
 CSV_FILE = "product.csv"      # Файл, который будем обновлять
 IMAGES_DIR = "images"         # Папка с изображениями
 PROMPT_FILE = "prompt.txt"    # Файл с текстом промпта
 
-# Приоритет моделей
+# Приоритет моделей: дешёвая отвечает на всё, сильная — только на сложные случаи
 PRIMARY_MODEL = "gpt-4o-mini"    # Замените на актуальное название модели
 FALLBACK_MODEL = "gpt-4o"        # Замените на актуальное название модели 
 
+# Каскад: ответы ниже порога уверенности уходят на FALLBACK_MODEL пачками
+CONFIDENCE_THRESHOLD = float(os.getenv("CONFIDENCE_THRESHOLD", "0.7"))
+ESCALATION_BATCH_SIZE = int(os.getenv("ESCALATION_BATCH_SIZE", "4"))
+
+# Цены моделей в $ за 1M токенов: (вход, выход)
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+# Метки частей костюма, которые ищем в каждой папке
+SUIT_LABELS = ("full", "top", "bottom")
+
+# Инструкция к промпту: структурированный ответ вместо свободного описания
+STRUCTURED_RESPONSE_INSTRUCTIONS = """
+Answer strictly in JSON. For each image return an object
+{"index": <image number starting from 0>, "label": "full" | "top" | "bottom" | "other",
+ "confidence": <number from 0 to 1>, "caption": "<short description>"}
+and wrap them as {"results": [...]}.
+"""
+
+# Статистика по уровням каскада: запросы, попадания, эскалации, токены и стоимость
+tier_stats = {
+    model: {"requests": 0, "images": 0, "accepted": 0, "escalated": 0,
+            "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+    for model in (PRIMARY_MODEL, FALLBACK_MODEL)
+}
+stats_lock = threading.Lock()
+
 def load_prompt(file_path):
     """Загружает текст промпта из файла."""
     if not os.path.exists(file_path):
@@ -82,83 +136,217 @@ def encode_image_to_base64(image_path):
     with open(image_path, "rb") as img_file:
         return base64.b64encode(img_file.read()).decode('utf-8')
 
-def analyze_image_with_model(image_base64, prompt, model):
-    """Отправляет изображение и промпт модели для анализа через прокси."""
+def record_usage(model, usage, images_count):
+    """Учитывает токены и стоимость запроса в статистике уровня каскада."""
+    with stats_lock:
+        stats = tier_stats[model]
+        stats["requests"] += 1
+        stats["images"] += images_count
+        if usage:
+            stats["prompt_tokens"] += usage.prompt_tokens
+            stats["completion_tokens"] += usage.completion_tokens
+            input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+            stats["cost"] += (usage.prompt_tokens * input_price + usage.completion_tokens * output_price) / 1_000_000
+
+def parse_classification(content, images_count):
+    """
+    Разбирает JSON-ответ модели в список классификаций по порядку изображений.
+    Если ответ не JSON, метку пытаемся достать из текста по ключевым словам.
+    """
+    results = [None] * images_count
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        data = {"results": [{"index": 0, "caption": content or ""}]} if images_count == 1 else {}
+
+    items = data.get("results", [data]) if isinstance(data, dict) else data
+    for position, item in enumerate(items if isinstance(items, list) else []):
+        if not isinstance(item, dict):
+            continue
+        index = item.get("index", position)
+        if not isinstance(index, int) or not 0 <= index < images_count:
+            continue
+        caption = str(item.get("caption", ""))
+        label = normalize_label(item.get("label"), caption)
+        try:
+            confidence = min(max(float(item.get("confidence", 0.0)), 0.0), 1.0)
+        except (TypeError, ValueError):
+            confidence = 0.0
+        results[index] = {"label": label, "confidence": confidence, "caption": caption}
+    return results
+
+def normalize_label(label, caption):
+    """
+    Приводит метку модели к одной из SUIT_LABELS или "other": "Full look" -> "full".
+    Неизвестную метку ("jacket" и т.п.) определяем по ключевым словам метки и подписи.
+    """
+    words = str(label or "").strip().lower().split()
+    if words and words[0] in SUIT_LABELS + ("other",):
+        return words[0]
+    from_label = label_from_caption(" ".join(words))
+    return from_label if from_label != "other" else label_from_caption(caption)
+
+def label_from_caption(caption):
+    """Старое правило по ключевым словам: подпись -> full/top/bottom."""
+    caption_lower = caption.lower()
+    if "full body" in caption_lower or "overall look" in caption_lower:
+        return "full"
+    if "jacket" in caption_lower or "upper body" in caption_lower:
+        return "top"
+    if "pants" in caption_lower or "lower body" in caption_lower:
+        return "bottom"
+    return "other"
+
+def classify_with_model(images_base64, prompt, model):
+    """
+    Отправляет одно или несколько изображений модели одним запросом и
+    возвращает список классификаций ({label, confidence, caption}) по порядку.
+    """
+    content = [{"type": "text", "text": prompt + STRUCTURED_RESPONSE_INSTRUCTIONS}]
+    for image_base64 in images_base64:
+        content.append({
+            "type": "image_url",
+            "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"},
+        })
+
     try:
         response = client.chat.completions.create(
             model=model,
-            messages=[
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": f"Анализируй следующее изображение. data:image/jpeg;base64,{image_base64}"}
-            ]
+            messages=[{"role": "user", "content": content}],
+            response_format={"type": "json_object"},
         )
-        return response["choices"][0]["message"]["content"]
     except OpenAIError as e:
         logging.error(f"Ошибка при использовании модели {model}: {e}")
-        return None
+        record_usage(model, None, len(images_base64))
+        return [None] * len(images_base64)
+
+    record_usage(model, response.usage, len(images_base64))
+    return parse_classification(response.choices[0].message.content, len(images_base64))
+
+def find_escalations(classifications):
+    """
+    Индексы изображений, которые надо отдать сильной модели:
+    - нет ответа или уверенность ниже CONFIDENCE_THRESHOLD;
+    - какой-то части костюма нет: тогда переспрашиваем фото с меткой "other"
+      и повторяющимися метками (например, два "full" и ни одного "bottom").
+    """
+    escalate = {
+        i for i, result in enumerate(classifications)
+        if result is None or result["confidence"] < CONFIDENCE_THRESHOLD
+    }
+
+    confident = [(i, r["label"]) for i, r in enumerate(classifications) if i not in escalate]
+    present = {label for _, label in confident}
+    if any(label not in present for label in SUIT_LABELS):
+        escalate.update(i for i, label in confident if label == "other")
+        for label in SUIT_LABELS:
+            duplicates = [i for i, l in confident if l == label]
+            if len(duplicates) > 1:
+                escalate.update(duplicates)
+
+    return sorted(escalate)
 
 def analyze_images(folder_name, image_paths, prompt):
-    """Анализирует изображения и возвращает подходящие фото."""
-    results = []
+    """
+    Каскадная классификация изображений костюма:
+    1) PRIMARY_MODEL классифицирует каждое фото со степенью уверенности;
+    2) неуверенные и конфликтующие фото пачками уходят на FALLBACK_MODEL.
+    Пачки эскалаций собираются в пределах одного костюма (один вызов classify_suit),
+    между костюмами фото в один запрос не объединяются.
+    Возвращает список (img_path, {label, confidence, caption}).
+    """
+    images_base64 = []
+    valid_paths = []
     for img_path in image_paths:
         try:
-            logging.info(f"Анализируем изображение: {img_path}")
-            image_base64 = encode_image_to_base64(img_path)
-
-            # Попробуем использовать основную модель
-            caption = analyze_image_with_model(image_base64, prompt, PRIMARY_MODEL)
-
-            if not caption:
-                logging.warning(f"Переход к {FALLBACK_MODEL} для изображения {img_path}.")
-                # Попробуем fallback-модель
-                caption = analyze_image_with_model(image_base64, prompt, FALLBACK_MODEL)
-
-            if caption:
-                logging.debug(f"Результат анализа для {img_path}: {caption}")
-                results.append((img_path, caption))
-            else:
-                logging.error(f"Не удалось получить результат анализа для {img_path}.")
-        except Exception as e:
-            logging.error(f"Ошибка анализа изображения {img_path}: {e}")
+            images_base64.append(encode_image_to_base64(img_path))
+            valid_paths.append(img_path)
+        except OSError as e:
+            logging.error(f"Ошибка чтения изображения {img_path}: {e}")
+
+    classifications = []
+    for img_path, image_base64 in zip(valid_paths, images_base64):
+        logging.info(f"Анализируем изображение: {img_path}")
+        classifications.extend(classify_with_model([image_base64], prompt, PRIMARY_MODEL))
+
+    escalations = find_escalations(classifications)
+    with stats_lock:
+        tier_stats[PRIMARY_MODEL]["accepted"] += len(valid_paths) - len(escalations)
+        tier_stats[PRIMARY_MODEL]["escalated"] += len(escalations)
+
+    if escalations:
+        logging.warning(f"Переход к {FALLBACK_MODEL} для {len(escalations)} изображений из '{folder_name}'.")
+    for start in range(0, len(escalations), ESCALATION_BATCH_SIZE):
+        batch = escalations[start:start + ESCALATION_BATCH_SIZE]
+        fallback_results = classify_with_model([images_base64[i] for i in batch], prompt, FALLBACK_MODEL)
+        for i, result in zip(batch, fallback_results):
+            if result:
+                classifications[i] = result
+                if result["confidence"] >= CONFIDENCE_THRESHOLD:
+                    with stats_lock:
+                        tier_stats[FALLBACK_MODEL]["accepted"] += 1
+
+    results = []
+    for img_path, result in zip(valid_paths, classifications):
+        if result:
+            logging.debug(f"Результат анализа для {img_path}: {result}")
+            results.append((img_path, result))
+        else:
+            logging.error(f"Не удалось получить результат анализа для {img_path}.")
     return results
 
 def select_images(analysis_results):
-    """Выбирает подходящие изображения для Full, Top и Bottom."""
-    full_image = None
-    top_image = None
-    bottom_image = None
-
-    for img_path, caption in analysis_results:
-        caption_lower = caption.lower()
-        if "full body" in caption_lower or "overall look" in caption_lower:
-            if not full_image:
-                full_image = img_path
-        elif "jacket" in caption_lower or "upper body" in caption_lower:
-            if not top_image:
-                top_image = img_path
-        elif "pants" in caption_lower or "lower body" in caption_lower:
-            if not bottom_image:
-                bottom_image = img_path
-
+    """Выбирает подходящие изображения для Full, Top и Bottom — самые уверенные по каждой метке."""
+    best = {}
+    for img_path, result in analysis_results:
+        label = result["label"]
+        if label in SUIT_LABELS and (label not in best or result["confidence"] > best[label][1]):
+            best[label] = (img_path, result["confidence"])
+
+    full_image, top_image, bottom_image = (best[label][0] if label in best else None for label in SUIT_LABELS)
     return full_image, top_image, bottom_image
 
-def update_csv(csv_file, folder_name, full_image, top_image, bottom_image):
-    """Обновляет CSV-файл с новыми путями изображений."""
+def log_tier_stats():
+    """Пишет в лог долю попаданий и стоимость по каждому уровню каскада."""
+    for model, stats in tier_stats.items():
+        hit_rate = stats["accepted"] / stats["images"] if stats["images"] else 0.0
+        logging.info(
+            f"Модель {model}: запросов {stats['requests']}, изображений {stats['images']}, "
+            f"попаданий {hit_rate:.0%}, эскалаций {stats['escalated']}, "
+            f"токенов {stats['prompt_tokens']}+{stats['completion_tokens']}, стоимость ${stats['cost']:.4f}"
+        )
+
+def classify_suit(folder_name, image_files, prompt):
+    """
+    Полный цикл для одного костюма без обхода папок: каскадная классификация и выбор
+    Full/Top/Bottom. image_files — {путь_к_файлу: ссылка}; возвращает ссылки (full, top, bottom).
+    """
+    analysis_results = analyze_images(folder_name, list(image_files), prompt)
+    selected = select_images(analysis_results)
+    return tuple(image_files.get(img_path) if img_path else None for img_path in selected)
+
+def apply_suit_images(row, full_image, top_image, bottom_image):
+    """Проставляет в строку товара Image (full) и Ext Images (top, bottom)."""
+    if full_image:
+        row['Image'] = full_image
+    ext_images = []
+    if top_image:
+        ext_images.append(top_image)
+    if bottom_image:
+        ext_images.append(bottom_image)
+    row['Ext Images'] = ','.join(ext_images)
+    return row
+
+def update_csv(csv_file, suit_images):
+    """Обновляет CSV-файл: для строк по ID из suit_images проставляет ссылки (full, top, bottom)."""
     updated_rows = []
     with open(csv_file, 'r', encoding='utf-8-sig') as file:
         reader = csv.DictReader(file, delimiter=';')
         fieldnames = reader.fieldnames
         for row in reader:
-            if folder_name.lower() in row['Name'].lower():
-                logging.info(f"Обновляем записи для {folder_name} в CSV.")
-                if full_image:
-                    row['Image'] = full_image
-                ext_images = []
-                if top_image:
-                    ext_images.append(top_image)
-                if bottom_image:
-                    ext_images.append(bottom_image)
-                row['Ext Images'] = ','.join(ext_images)
+            if row['ID'] in suit_images:
+                logging.info(f"Обновляем записи для {row['Name']} ({row['ID']}) в CSV.")
+                apply_suit_images(row, *suit_images[row['ID']])
             updated_rows.append(row)
 
     with open(csv_file, 'w', encoding='utf-8-sig', newline='') as file:
@@ -171,44 +359,34 @@ def update_csv(csv_file, folder_name, full_image, top_image, bottom_image):
 def main():
     start_time = time.time()
 
+    init_client()
+
     # Загружаем промпт
     prompt = load_prompt(PROMPT_FILE)
 
-    # Проверяем папку изображений
-    if not os.path.exists(IMAGES_DIR):
-        logging.error(f"Папка с изображениями '{IMAGES_DIR}' не найдена.")
+    # Манифест костюмов/смокингов от parser_3.py / profiles.py: {ID: {папка, {путь_к_файлу: ссылка}}}
+    suit_manifest = load_suit_manifest()
+    if suit_manifest is None:
+        logging.error(f"Манифест костюмов '{SUITS_MANIFEST_FILE}' не найден. "
+                      f"Сначала запустите parser_3.py или profiles.py.")
         exit(1)
 
-    # Собираем подпапки с "костюмами" или "смокингами"
-    subfolders = [
-        f for f in os.listdir(IMAGES_DIR)
-        if os.path.isdir(os.path.join(IMAGES_DIR, f)) and ("костюм" in f.lower() or "смокинг" in f.lower())
-    ]
-
-    if not subfolders:
-        logging.warning("Не найдено папок, соответствующих 'костюм' или 'смокинг'.")
+    if not suit_manifest:
+        logging.warning("В манифесте нет костюмов или смокингов.")
         exit(1)
 
-    # Проходим по каждой папке
-    for folder_name in subfolders:
-        folder_path = os.path.join(IMAGES_DIR, folder_name)
-        image_files = [
-            os.path.join(folder_path, f) for f in os.listdir(folder_path)
-            if f.lower().endswith(('.jpg', '.jpeg', '.png'))
-        ]
-
-        if not image_files:
-            logging.warning(f"В папке '{folder_name}' нет изображений. Пропускаем.")
+    # Проходим по каждому костюму
+    suit_images = {}
+    for external_id, suit in suit_manifest.items():
+        if not suit['images']:
+            logging.warning(f"Для '{suit['folder']}' нет изображений. Пропускаем.")
             continue
+        suit_images[external_id] = classify_suit(suit['folder'], suit['images'], prompt)
 
-        # Анализируем изображения
-        analysis_results = analyze_images(folder_name, image_files, prompt)
-
-        # Выбираем подходящие изображения
-        full_image, top_image, bottom_image = select_images(analysis_results)
+    # Обновляем CSV один раз для всех костюмов
+    update_csv(CSV_FILE, suit_images)
 
-        # Обновляем CSV
-        update_csv(CSV_FILE, folder_name, full_image, top_image, bottom_image)
+    log_tier_stats()
 
     end_time = time.time()
     logging.info(f"Обновление CSV завершено. Время выполнения: {end_time - start_time:.2f} секунд.")
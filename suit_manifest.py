@@ -0,0 +1,32 @@
+import json
+import os
+
+# Манифест костюмов/смокингов: {ID: {"folder": папка, "images": {путь_к_файлу: ссылка}}}.
+# Пишут его parser_3.py и profiles.py, читает sort_and_update_csv.py — модуль без
+# сторонних зависимостей, чтобы парсеру не нужен был openai ради пути к файлу.
+
+IMAGES_DIR = "images"
+SUITS_MANIFEST_FILE = os.path.join(IMAGES_DIR, "manifest.json")
+
+
+def suit_manifest_entry(index, product, image_files):
+    """Запись манифеста для товара: папка с фото и {путь_к_файлу: ссылка}."""
+    return {
+        'folder': f"{index+1}. {product['Name']}",
+        'images': image_files,
+    }
+
+
+def save_suit_manifest(suit_manifest, path=SUITS_MANIFEST_FILE):
+    """Сохраняем манифест, чтобы sort_and_update_csv.py классифицировал костюмы без обхода папки images."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as mf:
+        json.dump(suit_manifest, mf, ensure_ascii=False, indent=2)
+
+
+def load_suit_manifest(path=SUITS_MANIFEST_FILE):
+    """Загружает манифест; None, если его ещё нет."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as mf:
+        return json.load(mf)